@@ -0,0 +1,262 @@
+"""Load test of the task planner routes.
+
+Seeds tasks through /api/tasks/import, drives every route with concurrent requests and writes
+throughput and latency percentiles into a JSON report, e.g.
+
+    python -m benchmarks --tasks 10000 --output benchmark.json
+    python -m benchmarks --url http://127.0.0.1:6001 --auth test:test --tasks 1000000
+
+Without --url the application runs in-process with its lifespan and the configured database
+(CONFIG_FILE), which is migrated first. --reset-db empties it before seeding; it is refused unless the
+database name contains "bench" or "test". With --url the server should use an empty database.
+
+    CONFIG_FILE=test/test_config.yaml python -m benchmarks --reset-db --tasks 10000
+"""
+import argparse
+import asyncio
+import datetime
+import platform
+import random
+import re
+import statistics
+import subprocess
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Callable
+
+import httpx
+import ujson
+from loguru import logger
+
+from benchmarks.seed import ndjson_chunks, VERBS, COMMENTS
+from task_planner.configs.config import load_config
+from task_planner.workers.migrations import connect, migrate
+
+RequestFactory = Callable[[random.Random, datetime.date], dict]
+DISPOSABLE_DB_NAME = re.compile(r"bench|test", re.IGNORECASE)
+
+
+def random_month(rnd: random.Random, today: datetime.date) -> tuple[int, int]:
+    month_index = today.year * 12 + today.month - 1 + rnd.randint(-6, 6)
+    return month_index // 12, month_index % 12 + 1
+
+
+def search_task(rnd: random.Random, today: datetime.date) -> dict:
+    """Half of the searches are full-text, the other half filter by comment from the start of a month."""
+    if rnd.random() < 0.5:
+        return {"method": "POST", "url": "/search_task", "data": {"text": rnd.choice(VERBS)}}
+    year, month = random_month(rnd, today)
+    return {"method": "POST", "url": "/search_task", "data": {
+        "comment": rnd.choice([comment for comment in COMMENTS if comment]),
+        "start_year": str(year), "start_month": str(month), "start_day": "1",
+    }}
+
+
+def read_calendar(rnd: random.Random, today: datetime.date) -> dict:
+    year, month = random_month(rnd, today)
+    return {"method": "GET", "url": f"/read_calendar/{year}/{month}"}
+
+
+def tasks_count(rnd: random.Random, today: datetime.date) -> dict:
+    params = {"done": rnd.choice(["true", "false"])} if rnd.random() < 0.5 else {}
+    return {"method": "GET", "url": "/api/tasks_count", "params": params, "api": True}
+
+
+def download(rnd: random.Random, today: datetime.date) -> dict:
+    start = today + datetime.timedelta(days=rnd.randint(-30, 30))
+    end = start + datetime.timedelta(days=6)
+    return {"method": "GET", "url": "/download", "params": {
+        "start_year": start.year, "start_month": start.month, "start_day": start.day,
+        "end_year": end.year, "end_month": end.month, "end_day": end.day,
+    }}
+
+
+ROUTES: dict[str, RequestFactory] = {
+    "/get_all_tasks": lambda rnd, today: {"method": "GET", "url": "/get_all_tasks"},
+    "/search_task": search_task,
+    "/read_calendar": read_calendar,
+    "/api/tasks_info": lambda rnd, today: {"method": "GET", "url": "/api/tasks_info", "params": {"limit": 50},
+                                           "api": True},
+    "/api/tasks_count": tasks_count,
+    "/download": download,
+}
+
+
+def percentiles(latencies: list[float]) -> dict[str, float | None]:
+    """Latency percentiles in milliseconds, all None if no request got a response."""
+    if not latencies:
+        return dict.fromkeys(("p50", "p95", "p99", "mean", "max"))
+    if len(latencies) < 2:
+        cuts = latencies * 99
+    else:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50": round(cuts[49] * 1000, 3),
+        "p95": round(cuts[94] * 1000, 3),
+        "p99": round(cuts[98] * 1000, 3),
+        "mean": round(statistics.fmean(latencies) * 1000, 3),
+        "max": round(max(latencies) * 1000, 3),
+    }
+
+
+async def seed(client: httpx.AsyncClient, auth: tuple[str, str], args: argparse.Namespace, today: datetime.date):
+    imported, failed, start_time = 0, 0, time.perf_counter()
+    for chunk in ndjson_chunks(args.tasks, args.seed, today, args.import_chunk_size):
+        response = await client.post("/api/tasks/import", auth=auth,
+                                     files={"file": ("tasks.ndjson", chunk, "application/x-ndjson")})
+        response.raise_for_status()
+        imported += response.json()["imported"]
+        failed += response.json()["failed"]
+    logger.info(f"Seeded {imported} tasks ({failed} failed) in {time.perf_counter() - start_time:0.1f} seconds")
+    return imported
+
+
+async def run_route(client: httpx.AsyncClient,
+                    auth: tuple[str, str],
+                    factory: RequestFactory,
+                    args: argparse.Namespace,
+                    today: datetime.date) -> dict:
+    rnd = random.Random(args.seed)
+    requests = iter([factory(rnd, today) for _ in range(args.warmup + args.requests)])
+    latencies, statuses = [], Counter()
+
+    async def send(request: dict) -> str:
+        if request.pop("api", False):
+            request["auth"] = auth
+        try:
+            response = await client.request(**request)
+            return str(response.status_code)
+        except httpx.HTTPError as e:
+            return e.__class__.__name__
+
+    for _ in range(args.warmup):
+        await send(next(requests))
+
+    async def worker():
+        for request in requests:
+            start_time = time.perf_counter()
+            status = await send(request)
+            # Requests that failed without a response are counted as errors but not timed.
+            if status.isdigit():
+                latencies.append(time.perf_counter() - start_time)
+            statuses[status] += 1
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    duration = time.perf_counter() - start_time
+    sent = sum(statuses.values())
+    return {
+        "requests": sent,
+        "errors": sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500),
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(sent / duration, 2) if duration else 0.0,
+        "latency_ms": percentiles(latencies),
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+
+@asynccontextmanager
+async def open_client(args: argparse.Namespace):
+    timeout = httpx.Timeout(args.timeout)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout) as client:
+            yield client, None
+        return
+    from task_planner.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=timeout) as client:
+            yield client, app
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def prepare_database(args: argparse.Namespace):
+    """Migrates the database of an in-process run and, with --reset-db, empties it.
+    Only a database named as a benchmark or test one may be emptied."""
+    config = load_config()
+    if config.storage.backend != "postgres":
+        return
+    if args.reset_db and not DISPOSABLE_DB_NAME.search(config.db.db_name):
+        raise SystemExit(f'Refusing to empty database {config.db.db_name}: --reset-db needs a database '
+                         f'with "bench" or "test" in its name')
+    await migrate(config, create_db=False)
+    if args.reset_db:
+        conn = await connect(config)
+        try:
+            await conn.execute("TRUNCATE tasks_data, tasks_archive RESTART IDENTITY")
+        finally:
+            await conn.close()
+        logger.info(f"Database {config.db.db_name} is emptied")
+
+
+async def main(args: argparse.Namespace):
+    today = datetime.date.fromisoformat(args.today) if args.today else datetime.date.today()
+    if not args.url:
+        await prepare_database(args)
+    async with open_client(args) as (client, app):
+        if args.auth:
+            auth = tuple(args.auth.split(":", 1))
+        else:
+            auth = (app.state.config.api.login, app.state.config.api.password)
+        if not args.skip_seed:
+            await seed(client, auth, args, today)
+        results = {}
+        for route in args.routes:
+            results[route] = await run_route(client, auth, ROUTES[route], args, today)
+            logger.info(f"{route}: {results[route]['throughput_rps']} rps, {results[route]['errors']} errors, "
+                        f"latency {results[route]['latency_ms']}")
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "target": args.url or "in-process",
+            "python": platform.python_version(),
+            "tasks": args.tasks,
+            "seed": args.seed,
+            "today": today.isoformat(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+        },
+        "routes": results,
+    }
+    with open(args.output, "w") as file:
+        file.write(ujson.dumps(report, indent=2, ensure_ascii=False, escape_forward_slashes=False))
+    logger.info(f"Report is written to {args.output}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Load test of the task planner routes")
+    parser.add_argument("--url", help="base url of a running server, the app runs in-process if omitted")
+    parser.add_argument("--auth", help="login:password for /api routes, taken from the config in-process")
+    parser.add_argument("--tasks", type=int, default=10_000, help="number of tasks to seed (10000)")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the tasks already in the database")
+    parser.add_argument("--reset-db", action="store_true",
+                        help="empty the configured benchmark or test database before seeding, in-process only")
+    parser.add_argument("--seed", type=int, default=42, help="random seed of the data set and requests (42)")
+    parser.add_argument("--today", help="date the deadlines are distributed around, YYYY-MM-DD (today)")
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per route (500)")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per route (20)")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent clients (20)")
+    parser.add_argument("--timeout", type=float, default=300, help="request timeout in seconds (300)")
+    parser.add_argument("--import-chunk-size", type=int, default=50_000, help="tasks per import request (50000)")
+    parser.add_argument("--routes", nargs="+", choices=list(ROUTES), default=list(ROUTES), help="routes to drive")
+    parser.add_argument("--output", default="benchmark.json", help="report file (benchmark.json)")
+    args = parser.parse_args()
+    if args.url and not args.auth:
+        parser.error("--auth is required with --url")
+    if args.url and args.reset_db:
+        parser.error("--reset-db works in-process only, empty the server database yourself")
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,46 @@
+import datetime
+import random
+from typing import Iterator
+
+import ujson
+
+VERBS = ("позвонить", "написать", "купить", "оплатить", "проверить", "отправить", "забрать", "записаться")
+OBJECTS = ("врачу", "отчет", "продукты", "счета", "почту", "документы", "посылку", "к стоматологу")
+COMMENTS = ("", "", "срочно", "не забыть", "после обеда", "обсудить с командой", "взять документы")
+
+
+def random_deadline(rnd: random.Random, today: datetime.date) -> datetime.date:
+    """Most tasks are due in the next weeks, a long tail is overdue or planned up to a year ahead."""
+    bucket = rnd.random()
+    if bucket < 0.6:
+        offset = int(rnd.expovariate(1 / 10))
+    elif bucket < 0.85:
+        offset = -int(rnd.expovariate(1 / 45)) - 1
+    else:
+        offset = rnd.randint(30, 365)
+    return today + datetime.timedelta(days=offset)
+
+
+def generate_tasks(count: int, seed: int, today: datetime.date) -> Iterator[dict]:
+    """Yields the same tasks for the same seed and date; (name, deadline) pairs never repeat."""
+    rnd = random.Random(seed)
+    for number in range(count):
+        deadline = random_deadline(rnd, today)
+        done_probability = 0.8 if deadline < today else 0.1
+        yield {
+            "name": f"{rnd.choice(VERBS)} {rnd.choice(OBJECTS)} {number}",
+            "deadline": deadline.isoformat(),
+            "comment": rnd.choice(COMMENTS),
+            "done": rnd.random() < done_probability,
+        }
+
+
+def ndjson_chunks(count: int, seed: int, today: datetime.date, chunk_size: int) -> Iterator[bytes]:
+    chunk = []
+    for task in generate_tasks(count, seed, today):
+        chunk.append(ujson.dumps(task, ensure_ascii=False))
+        if len(chunk) >= chunk_size:
+            yield ("\n".join(chunk) + "\n").encode()
+            chunk = []
+    if chunk:
+        yield ("\n".join(chunk) + "\n").encode()
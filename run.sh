@@ -1,5 +1,14 @@
 #!/bin/sh
-docker rm -f task_planner
+set -e
+# Migrations run once per deploy, the application refuses to start on an unmigrated database.
+docker run \
+-e CONFIG_FILE=/usr/task_planner/task_planner/configs/config.yaml \
+-v $(pwd)/task_planner/configs/config.yaml:/usr/task_planner/task_planner/configs/config.yaml \
+--network=host \
+--rm \
+task_planner:1.0.0 \
+python -m task_planner.migrate
+docker rm -f task_planner || true
 docker run \
 -e APP_PORT=8001 \
 -e CONFIG_FILE=/usr/task_planner/task_planner/configs/config.yaml \
@@ -1,26 +1,53 @@
 import asyncio
 import time
+from contextlib import contextmanager
 from functools import wraps
 from loguru import logger
 
+from task_planner.application.metrics import FUNCTION_DURATION
+
 
 def measure_time(func):
+    """Records the call latency into the function duration histogram, failed calls included."""
+    def record(start_time: float):
+        time_elapsed = time.perf_counter() - start_time
+        FUNCTION_DURATION.observe(time_elapsed, func.__qualname__)
+        logger.debug(f"Function {func.__qualname__} took {time_elapsed:0.3f} seconds")
+
     @wraps(func)
     def wrapped(*args, **kwargs):
         start_time = time.perf_counter()
-        result = func(*args, **kwargs)
-        time_elapsed = time.perf_counter() - start_time
-        logger.debug(f"Function {func.__name__} took {time_elapsed:0.3f} seconds")
-        return result
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record(start_time)
 
     @wraps(func)
     async def async_wrapped(*args, **kwargs):
         start_time = time.perf_counter()
-        result = await func(*args, **kwargs)
-        time_elapsed = time.perf_counter() - start_time
-        logger.debug(f"Function {func.__name__} took {time_elapsed:0.3f} seconds")
-        return result
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            record(start_time)
 
     return async_wrapped if asyncio.iscoroutinefunction(func) else wrapped
 
 
+class StartupReport:
+    """Times named startup phases and logs them as one line."""
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.phases: list[tuple[str, float]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start_time))
+
+    def log(self):
+        phases = ", ".join(f"{name} {elapsed:0.3f}" for name, elapsed in self.phases)
+        logger.info(f"Startup took {time.perf_counter() - self.start_time:0.3f} seconds: {phases}")
@@ -0,0 +1,54 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LRUCache:
+    """In-process LRU cache with a time-to-live for every entry.
+
+    Every key has a version that is bumped by invalidate(), and clear() bumps the versions of all keys,
+    cached or not, through a cache-wide generation. A reader takes the version before loading a value and
+    passes it to set(), so a value loaded before a concurrent write or clear is not cached.
+    """
+
+    def __init__(self, max_size: int = 128, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._versions: dict[Hashable, int] = {}
+        self._generation = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def version(self, key: Hashable) -> int:
+        return self._generation + self._versions.get(key, 0)
+
+    def set(self, key: Hashable, value: Any, version: int | None = None):
+        if version is not None and version != self.version(key):
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._versions[key] = self._versions.get(key, 0) + 1
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._generation += 1
+        self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._data), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
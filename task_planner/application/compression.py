@@ -0,0 +1,192 @@
+import time
+import zlib
+from typing import Callable
+
+from loguru import logger
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from task_planner.application.metrics import HTTP_COMPRESSION_BYTES, HTTP_COMPRESSION_CPU, HTTP_COMPRESSION_RATIO
+from task_planner.configs.config import Compression
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+UNCOMPRESSIBLE_STATUSES = (204, 206, 304)
+
+
+class GzipEncoder:
+    def __init__(self, config: Compression):
+        self.compressor = zlib.compressobj(config.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class BrotliEncoder:
+    def __init__(self, config: Compression):
+        self.compressor = brotli.Compressor(quality=config.brotli_quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self.compressor.process(data) + (self.compressor.finish() if final else self.compressor.flush())
+
+
+class ZstdEncoder:
+    def __init__(self, config: Compression):
+        self.compressor = zstandard.ZstdCompressor(level=config.zstd_level).compressobj()
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        flush_mode = zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        return self.compressor.compress(data) + self.compressor.flush(flush_mode)
+
+
+# Encodings whose library is installed; gzip is always there.
+ENCODERS: dict[str, Callable] = {"gzip": GzipEncoder}
+if brotli is not None:
+    ENCODERS["br"] = BrotliEncoder
+if zstandard is not None:
+    ENCODERS["zstd"] = ZstdEncoder
+
+
+def choose_encoding(accept_encoding: str, encodings: list[str]) -> str | None:
+    """Returns the first of encodings, in the configured order, that is installed and that the client accepts."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name.strip():
+            accepted[name.strip().lower()] = quality
+    for encoding in encodings:
+        if encoding in ENCODERS and accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+class CompressedResponse:
+    """Send wrapper compressing one response, streamed or not.
+
+    The start message is held until the body reaches minimum_size or ends, so small responses go out
+    as they are. A whole body is compressed at once and gets a Content-Length; a streamed body is
+    compressed chunk by chunk and every chunk is flushed, so the client gets it without waiting for the rest.
+    """
+
+    def __init__(self, config: Compression, encoding: str, send: Send):
+        self.config = config
+        self.encoding = encoding
+        self._send = send
+        self.start: Message | None = None
+        self.pending: list[bytes] = []
+        self.pending_size = 0
+        self.encoder = None
+        self.passthrough = False
+        self.size_in = 0
+        self.size_out = 0
+        self.cpu_time = 0.0
+
+    def is_compressible(self, message: Message) -> bool:
+        headers = Headers(raw=message["headers"])
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        content_length = headers.get("content-length")
+        return (message["status"] not in UNCOMPRESSIBLE_STATUSES
+                and "content-encoding" not in headers
+                and content_type in self.config.content_types
+                and (content_length is None or int(content_length) >= self.config.minimum_size))
+
+    async def send(self, message: Message):
+        if self.passthrough:
+            await self._send(message)
+        elif message["type"] == "http.response.start":
+            self.start = message
+            if not self.is_compressible(message):
+                self.passthrough = True
+                await self._send(message)
+        elif message["type"] == "http.response.body":
+            await self.send_body(message.get("body", b""), message.get("more_body", False))
+        else:
+            await self._send(message)
+
+    async def send_body(self, body: bytes, more_body: bool):
+        if self.encoder is None:
+            self.pending.append(body)
+            self.pending_size += len(body)
+            if more_body and self.pending_size < self.config.minimum_size:
+                return
+            body = b"".join(self.pending)
+            self.pending.clear()
+            if len(body) < self.config.minimum_size:
+                self.passthrough = True
+                await self._send(self.start)
+                await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+            self.encoder = ENCODERS[self.encoding](self.config)
+            compressed = self.compress(body, final=not more_body)
+            headers = MutableHeaders(scope=self.start)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(compressed))
+            # The compressed body is another representation: a strong ETag must not match the original one.
+            etag = headers.get("ETag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            await self._send(self.start)
+        else:
+            compressed = self.compress(body, final=not more_body)
+        await self._send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+        if not more_body:
+            self.record()
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        # Compression runs on the event loop thread, so its thread CPU time is the cost of this response.
+        start_time = time.thread_time()
+        compressed = self.encoder.compress(data, final)
+        self.cpu_time += time.thread_time() - start_time
+        self.size_in += len(data)
+        self.size_out += len(compressed)
+        return compressed
+
+    def record(self):
+        HTTP_COMPRESSION_CPU.observe(self.cpu_time, self.encoding)
+        HTTP_COMPRESSION_BYTES.inc(self.encoding, "in", amount=self.size_in)
+        HTTP_COMPRESSION_BYTES.inc(self.encoding, "out", amount=self.size_out)
+        HTTP_COMPRESSION_RATIO.observe(self.size_out / self.size_in, self.encoding)
+        logger.debug(f"Response compressed with {self.encoding} from {self.size_in} to {self.size_out} bytes "
+                     f"in {self.cpu_time:0.4f} CPU seconds")
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing responses with the best encoding the client accepts.
+
+    Only responses of the allowed content types and at least minimum_size bytes are compressed, responses
+    that already have a Content-Encoding (e.g. the gzipped CSV download) are left alone. Event streams are
+    not in the default allowlist, so /events goes out unbuffered. br and zstd need the brotli and zstandard
+    packages; without them only gzip is offered.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        config = scope["app"].state.config.compression if scope["type"] == "http" else None
+        encoding = None
+        if config is not None and config.enabled:
+            encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""), config.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, CompressedResponse(config, encoding, send).send)
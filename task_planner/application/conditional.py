@@ -0,0 +1,28 @@
+import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request
+
+
+def make_etag(*parts) -> str:
+    return 'W/"' + '-'.join(str(part) for part in parts) + '"'
+
+
+def validator_headers(etag: str, modified_at: datetime.datetime) -> dict[str, str]:
+    """Clients must revalidate on every use, so the page is never shown stale."""
+    return {"ETag": etag, "Last-Modified": format_datetime(modified_at, usegmt=True), "Cache-Control": "no-cache"}
+
+
+def is_not_modified(request: Request, etag: str, modified_at: datetime.datetime) -> bool:
+    """Evaluates If-None-Match (weak comparison) or, when it is absent, If-Modified-Since."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return modified_at <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
@@ -0,0 +1,26 @@
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+
+@dataclass
+class ReadConsistency:
+    """Read consistency of the current request: until when its client must read from the primary
+    and whether the request has written itself."""
+    primary_until: float = 0
+    wrote: bool = False
+
+
+read_consistency: ContextVar[ReadConsistency | None] = ContextVar("read_consistency", default=None)
+
+
+def record_write():
+    consistency = read_consistency.get()
+    if consistency is not None:
+        consistency.wrote = True
+
+
+def primary_required() -> bool:
+    """Whether reads of the current request must go to the primary to see the client's own writes."""
+    consistency = read_consistency.get()
+    return consistency is not None and (consistency.wrote or consistency.primary_until > time.time())
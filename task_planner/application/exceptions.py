@@ -22,3 +22,21 @@ class InvalidDateFormatError(VerboseException):
 class NotFullDataError(VerboseException):
     pass
 
+
+
+class InvalidCursorError(VerboseException):
+    pass
+
+
+class TaskAlreadyExistsError(VerboseException):
+    def __init__(self, reason: str, task_id: int | None = None):
+        super().__init__(reason)
+        self.task_id = task_id
+
+
+class SchemaVersionError(VerboseException):
+    pass
+
+
+class MigrationError(VerboseException):
+    pass
@@ -0,0 +1,72 @@
+import csv
+import datetime
+import io
+import itertools
+from typing import BinaryIO, Iterator
+
+import ujson
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+CSV_COLUMNS = ("id", "name", "deadline", "comment", "done")
+CSV_DONE_VALUES = {"да": True, "нет": False, "true": True, "false": False, "1": True, "0": False}
+
+
+class ImportRow(BaseModel):
+    name: str = Field(min_length=1)
+    deadline: datetime.date
+    comment: str = ""
+    done: bool = False
+
+    @field_validator("done", mode="before")
+    @classmethod
+    def parse_done(cls, value):
+        if isinstance(value, str):
+            if value.strip().lower() not in CSV_DONE_VALUES:
+                raise ValueError(f"wrong done value {value}")
+            return CSV_DONE_VALUES[value.strip().lower()]
+        return value
+
+
+def read_csv(file: BinaryIO) -> Iterator[tuple[int, dict]]:
+    """Reads rows in the /download CSV format, the header row is skipped."""
+    reader = csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    for row in reader:
+        if reader.line_num == 1 and row and row[0] == "id":
+            continue
+        if not row:
+            continue
+        yield reader.line_num, dict(zip(CSV_COLUMNS, row))
+
+
+def read_ndjson(file: BinaryIO) -> Iterator[tuple[int, dict | None]]:
+    """Reads one JSON object per line, a line that is not an object is yielded as None."""
+    for line_num, line in enumerate(io.TextIOWrapper(file, encoding="utf-8"), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = ujson.loads(line)
+        except ValueError:
+            row = None
+        yield line_num, row if isinstance(row, dict) else None
+
+
+def take_rows(rows: Iterator, limit: int) -> list:
+    """Parses up to limit rows; handlers run it in the thread pool, so parsing does not block the event loop."""
+    return list(itertools.islice(rows, limit))
+
+
+def iter_import_rows(file: BinaryIO, file_format: str) -> Iterator[tuple[int, tuple | None, str | None]]:
+    """Yields (row number, (name, deadline, comment, done) or None, error or None) for every row of the file."""
+    rows = read_ndjson(file) if file_format == "ndjson" else read_csv(file)
+    for row_num, row in rows:
+        if row is None:
+            yield row_num, None, "wrong JSON object"
+            continue
+        try:
+            task = ImportRow.model_validate(row)
+        except ValidationError as e:
+            error = e.errors()[0]
+            yield row_num, None, f"{'.'.join(str(i) for i in error['loc'])}: {error['msg']}"
+            continue
+        deadline = datetime.datetime.combine(task.deadline, datetime.time.min)
+        yield row_num, (task.name.capitalize(), deadline, task.comment, task.done), None
@@ -0,0 +1,153 @@
+import bisect
+from typing import Callable
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    labels = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in sorted(self._values.items())]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+        self._series: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels):
+        counts, totals = self._series.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        totals[0] += value
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, (counts, totals) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {totals[0]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Adds a callback that refreshes gauges right before every scrape."""
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector: Callable[[], None]):
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "task_planner_http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+))
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "task_planner_http_requests_in_flight", "HTTP requests being processed", ("method",)
+))
+HTTP_RESPONSES = REGISTRY.register(Counter(
+    "task_planner_http_responses_total", "HTTP responses by route and status code", ("method", "route", "status")
+))
+FUNCTION_DURATION = REGISTRY.register(Histogram(
+    "task_planner_function_duration_seconds", "Latency of functions wrapped with measure_time", ("function",)
+))
+DB_POOL_CONNECTIONS = REGISTRY.register(Gauge(
+    "task_planner_db_pool_connections", "Database connection pool usage", ("state",)
+))
+SLOW_QUERIES = REGISTRY.register(Counter(
+    "task_planner_db_slow_queries_total", "Statements slower than the slow query log threshold"
+))
+CHANGE_EVENTS = REGISTRY.register(Counter(
+    "task_planner_change_events_total", "Task change events by origin: this worker or another one", ("origin",)
+))
+SSE_CLIENTS = REGISTRY.register(Gauge(
+    "task_planner_sse_clients", "Clients connected to the /events change feed"
+))
+DB_READS = REGISTRY.register(Counter(
+    "task_planner_db_reads_total", "Read-only queries by the database that served them", ("target",)
+))
+DB_REPLICA_UP = REGISTRY.register(Gauge(
+    "task_planner_db_replica_up", "Whether a read replica passes its health check", ("replica",)
+))
+REMINDERS_PENDING = REGISTRY.register(Gauge(
+    "task_planner_reminders_pending", "Reminders waiting in the timer heap"
+))
+REMINDERS_SENT = REGISTRY.register(Counter(
+    "task_planner_reminders_sent_total", "Reminders passed to sinks by sink and result", ("sink", "status")
+))
+HTTP_COMPRESSION_CPU = REGISTRY.register(Histogram(
+    "task_planner_http_compression_cpu_seconds", "CPU time spent compressing one response by encoding", ("encoding",)
+))
+HTTP_COMPRESSION_BYTES = REGISTRY.register(Counter(
+    "task_planner_http_compression_bytes_total", "Compressed response bytes before (in) and after (out) compression",
+    ("encoding", "stage")
+))
+HTTP_COMPRESSION_RATIO = REGISTRY.register(Histogram(
+    "task_planner_http_compression_ratio", "Compressed to original size of compressed responses", ("encoding",),
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+))
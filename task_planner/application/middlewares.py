@@ -1,6 +1,15 @@
+import math
+import time
+
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi import status
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from task_planner.application.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, HTTP_RESPONSES
+from task_planner.application.consistency import ReadConsistency, read_consistency
 
 security = HTTPBasic()
 
@@ -18,3 +27,83 @@ def basic_auth(login: str, password: str):
             )
         return credentials.username
     return credential_checker
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency, in-flight requests and status codes of every HTTP request.
+
+    The route label is the matched path template (e.g. /show_tasks/{date}), so the series count stays bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc(method)
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec(method)
+            route = scope.get("route")
+            route_path = getattr(route, "path", "<unmatched>")
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start_time, method, route_path)
+            HTTP_RESPONSES.inc(method, route_path, str(status_code))
+
+
+class ReadYourWritesMiddleware:
+    """Pure ASGI middleware keeping a client's reads on the primary for db.read_your_writes_seconds after
+    the client's own write, while replicas may still lag behind.
+
+    The deadline travels in a cookie, so it holds whichever worker serves the next request; values
+    that are not finite or lie further ahead than the window are not trusted.
+    Does nothing unless read replicas are configured.
+    """
+
+    cookie_name = "tp_primary_until"
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        db = scope["app"].state.config.db if scope["type"] == "http" else None
+        if db is None or not db.replicas:
+            await self.app(scope, receive, send)
+            return
+        try:
+            primary_until = float(HTTPConnection(scope).cookies.get(self.cookie_name, 0))
+        except ValueError:
+            primary_until = 0
+        # The cookie comes from the client: it can not pin reads to the primary past the window of a write.
+        if not math.isfinite(primary_until):
+            primary_until = 0
+        primary_until = min(primary_until, time.time() + db.read_your_writes_seconds)
+        consistency = ReadConsistency(primary_until=primary_until)
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start" and consistency.wrote:
+                until = time.time() + db.read_your_writes_seconds
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{self.cookie_name}={until:.3f}; Max-Age={math.ceil(db.read_your_writes_seconds)}; "
+                    f"Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        token = read_consistency.set(consistency)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            read_consistency.reset(token)
@@ -1,26 +1,56 @@
 import datetime
 
-from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean
+from sqlalchemy.orm import declarative_base, deferred
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Index, Computed, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 
 Base = declarative_base()
 
+SEARCH_VECTOR_EXPRESSION = "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(comment, ''))"
+
 
 class Task(Base):
     __tablename__ = 'tasks_data'
+    __table_args__ = (
+        Index('ix_tasks_data_deadline_id', 'deadline', 'id'),
+        Index('ix_tasks_data_name_deadline', 'name', 'deadline', unique=True),
+        Index('ix_tasks_data_search_vector', 'search_vector', postgresql_using='gin'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     deadline = Column(DateTime)
     comment = Column(Text)
     done = Column(Boolean, default=False)
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_EXPRESSION, persisted=True)))
 
     def __repr__(self):
         return f"Название: {self.name}\nКомментарий: {self.comment}\nВыполнить до: {self.deadline.strftime('%Y-%m-%d')}"
 
 
+Index('ix_tasks_data_name_lower', func.lower(Task.name))
+
+
+class ArchivedTask(Base):
+    """Done tasks moved out of tasks_data by the archive job, read with get_tasks(include_archived=True)."""
+    __tablename__ = 'tasks_archive'
+    __table_args__ = (
+        Index('ix_tasks_archive_deadline_id', 'deadline', 'id'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    deadline = Column(DateTime)
+    comment = Column(Text)
+    done = Column(Boolean)
+    archived_at = Column(DateTime, server_default=func.now())
+
+
+Index('ix_tasks_archive_name_lower', func.lower(ArchivedTask.name))
+
+
 class SearchTaskRequest(BaseModel):
     name: Optional[str] = None
     comment: Optional[str] = None
@@ -29,8 +59,18 @@ class SearchTaskRequest(BaseModel):
     done: Optional[str] = None
 
 
+class DeadlineBuckets(BaseModel):
+    overdue: int
+    today: int
+    week: int
+    later: int
+
+
 class TasksCountResponse(BaseModel):
     tasks_count: int
+    done_count: int = 0
+    open_count: int = 0
+    deadline_buckets: DeadlineBuckets | None = None
 
 
 class TaskInfo(BaseModel):
@@ -46,8 +86,87 @@ class TaskInfo(BaseModel):
 
 class TasksInfoResponse(BaseModel):
     tasks_info: list[TaskInfo]
+    next_cursor: str | None = None
+
+
+class TaskCounts(BaseModel):
+    total: int
+    done: int
+    open: int
+
+
+class YearDensityResponse(BaseModel):
+    year: int
+    months: dict[int, TaskCounts]
+    days: dict[str, TaskCounts] | None = None
+
+
+class CacheStats(BaseModel):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+
+
+class CacheStatsResponse(BaseModel):
+    calendar: CacheStats
+    fragments: CacheStats
+
+
+class ReminderInfo(BaseModel):
+    id: int
+    name: str
+    deadline: datetime.datetime
+    comment: str | None
+    remind_at: datetime.datetime
+
+
+class RemindersResponse(BaseModel):
+    enabled: bool
+    pending: int
+    reminders: list[ReminderInfo]
+
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+
+class ImportResponse(BaseModel):
+    imported: int
+    failed: int
+    errors: list[ImportRowError]
+
+
+class BatchUpdate(BaseModel):
+    ids: list[int]
+    done: bool | None = None
+    deadline: datetime.date | None = None
+    comment: str | None = None
+
+    @model_validator(mode='after')
+    def check_changes(self):
+        if self.done is None and self.deadline is None and self.comment is None:
+            raise ValueError('at least one of done, deadline, comment must be set')
+        return self
+
+
+class BatchRequest(BaseModel):
+    update: list[BatchUpdate] = []
+    delete: list[int] = []
+
+
+class BatchResult(BaseModel):
+    id: int
+    action: str
+    status: str
+
+
+class BatchResponse(BaseModel):
+    results: list[BatchResult]
 
 
 class TaskRequest(BaseModel):
     task_name: str
     done: bool | None = False
+    include_archived: bool = False
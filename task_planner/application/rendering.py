@@ -0,0 +1,77 @@
+import datetime
+import hashlib
+import os
+from typing import Awaitable, Callable, Hashable
+
+import jinja2
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, Response
+from fastapi.templating import Jinja2Templates
+from markupsafe import Markup
+
+from task_planner.application.cache import LRUCache
+from task_planner.application.conditional import validator_headers, is_not_modified
+from task_planner.configs.config import Rendering
+
+
+class Renderer:
+    """Jinja rendering shared by the HTML handlers.
+
+    Templates are compiled once at startup through a file system bytecode cache, so later workers load
+    compiled code instead of parsing. Pages without data are rendered once and served as bytes;
+    data-dependent fragments are cached under keys that include the data version they were built from.
+    Both are rendered with path-only url_for, so the cached HTML does not depend on the request host.
+    """
+
+    def __init__(self, app: FastAPI, directory: str, config: Rendering):
+        self.app = app
+        self.config = config
+        if config.bytecode_cache_dir:
+            os.makedirs(config.bytecode_cache_dir, exist_ok=True)
+            bytecode_cache = jinja2.FileSystemBytecodeCache(config.bytecode_cache_dir)
+        else:
+            # Jinja's default is a per-user 0700 directory in the temp dir, checked for ownership, so other
+            # local users cannot plant compiled templates in it.
+            bytecode_cache = jinja2.FileSystemBytecodeCache()
+        env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(directory),
+            autoescape=True,
+            bytecode_cache=bytecode_cache,
+        )
+        self.templates = Jinja2Templates(env=env)
+        self.pages: dict[str, tuple[bytes, str]] = {}
+        self.fragments = LRUCache(max_size=config.fragment_cache_size, ttl=config.fragment_ttl)
+        self.started_at = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+
+    def url_path_for(self, name: str, **path_params) -> str:
+        return self.app.url_path_for(name, **{key: str(value) for key, value in path_params.items()})
+
+    def render(self, template: str, **context) -> str:
+        return self.templates.get_template(template).render(url_for=self.url_path_for, **context)
+
+    def compile_templates(self):
+        for template in self.templates.env.list_templates(extensions=["html"]):
+            self.templates.get_template(template)
+
+    def prerender(self, *templates: str):
+        for template in templates:
+            content = self.render(template).encode()
+            self.pages[template] = content, f'"{hashlib.md5(content).hexdigest()}"'
+
+    def page(self, request: Request, template: str) -> Response:
+        content, etag = self.pages[template]
+        headers = validator_headers(etag, self.started_at)
+        headers["Cache-Control"] = f"public, max-age={self.config.static_max_age}"
+        if is_not_modified(request, etag, self.started_at):
+            return Response(status_code=304, headers=headers)
+        return HTMLResponse(content, headers=headers)
+
+    async def fragment(self, template: str, key: Hashable, load_context: Callable[[], Awaitable[dict]]) -> Markup:
+        """Renders the template once per key, loading its context only on a miss.
+        The key must include the version of the data taken before the context is loaded."""
+        cache_key = (template, key)
+        html = self.fragments.get(cache_key)
+        if html is None:
+            html = Markup(self.render(template, **await load_context()))
+            self.fragments.set(cache_key, html)
+        return html
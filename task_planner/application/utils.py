@@ -1,6 +1,7 @@
+import base64
 from datetime import datetime
 
-from task_planner.application.exceptions import InvalidDateFormatError, NotFullDataError
+from task_planner.application.exceptions import InvalidDateFormatError, NotFullDataError, InvalidCursorError
 
 
 async def get_deadline(year: str | int | None, month: str | int | None, day: str | int | None):
@@ -16,8 +17,16 @@ async def get_deadline(year: str | int | None, month: str | int | None, day: str
         raise InvalidDateFormatError(reason=f'Wrong date format {year}-{month}-{day}')
 
 
+def encode_cursor(deadline: datetime, task_id: int) -> str:
+    raw = f'{deadline.isoformat()}|{task_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode()
 
 
-
-
-
+def decode_cursor(cursor: str | None) -> tuple[datetime, int] | None:
+    if not cursor:
+        return None
+    try:
+        deadline, task_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(deadline), int(task_id)
+    except ValueError:
+        raise InvalidCursorError(reason=f'Wrong page cursor {cursor}')
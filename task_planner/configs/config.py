@@ -1,16 +1,33 @@
-from pydantic import BaseModel
+from typing import Literal
+
+from pydantic import BaseModel, model_validator
 from loguru import logger
 import ujson
 import yaml
 import os
 
 
+class Replica(BaseModel):
+    host: str
+    port: int = 5432
+    weight: float = 1
+
+
 class DB(BaseModel):
     host: str
     port: int = 5432
     db_name: str = "tasks"
     user: str = "luna"
     password: str = "luna"
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    pool_pre_ping: bool = True
+    statement_cache_size: int = 100
+    replicas: list[Replica] = []
+    replica_check_interval: float = 5
+    replica_check_timeout: float = 2
+    read_your_writes_seconds: float = 5
 
 
 class Api(BaseModel):
@@ -18,9 +35,127 @@ class Api(BaseModel):
     password: str
 
 
+class Pagination(BaseModel):
+    page_size: int = 50
+    max_page_size: int = 1000
+
+
+class Export(BaseModel):
+    chunk_size: int = 1000
+
+
+class Cache(BaseModel):
+    calendar_size: int = 128
+    calendar_ttl: float = 300
+
+
+class Purge(BaseModel):
+    enabled: bool = False
+    interval_minutes: int = 60
+    older_than_days: int = 30
+    batch_size: int = 1000
+
+
+class Archive(BaseModel):
+    enabled: bool = False
+    interval_minutes: int = 60
+    older_than_days: int = 90
+    batch_size: int = 1000
+
+
+class Partitioning(BaseModel):
+    months_ahead: int = 3
+    months_behind: int = 12
+    interval_hours: float = 24
+
+
+class BulkImport(BaseModel):
+    batch_size: int = 5000
+    max_errors: int = 1000
+
+
+class SlowQueryLog(BaseModel):
+    threshold_ms: float = 200
+    explain_sample_rate: float = 0
+
+
+class Storage(BaseModel):
+    backend: Literal["postgres", "memory"] = "postgres"
+
+
+class Rendering(BaseModel):
+    bytecode_cache_dir: str | None = None
+    static_max_age: int = 300
+    fragment_cache_size: int = 256
+    fragment_ttl: float = 3600
+
+
+class Compression(BaseModel):
+    enabled: bool = True
+    minimum_size: int = 1024
+    encodings: list[Literal["zstd", "br", "gzip"]] = ["zstd", "br", "gzip"]
+    content_types: list[str] = ["text/html", "text/csv", "text/plain", "text/css", "application/json",
+                                "application/x-ndjson", "application/javascript", "image/svg+xml"]
+    gzip_level: int = 6
+    brotli_quality: int = 4
+    zstd_level: int = 3
+
+
+class Metrics(BaseModel):
+    public: bool = False
+
+
+class Notifications(BaseModel):
+    enabled: bool = True
+    channel: str = "tasks_changed"
+    reconnect_delay: float = 5
+    sse_heartbeat: float = 15
+    sse_queue_size: int = 100
+
+
+class Reminders(BaseModel):
+    enabled: bool = False
+    lead_minutes: float = 0
+    sinks: list[Literal["log", "webhook", "file"]] = ["log"]
+    webhook_url: str | None = None
+    webhook_timeout: float = 5
+    file_path: str | None = None
+    max_concurrent_sends: int = 10
+    leader_retry_seconds: float = 30
+    load_chunk_size: int = 5000
+
+    @model_validator(mode="after")
+    def check_sinks(self):
+        if "webhook" in self.sinks and not self.webhook_url:
+            raise ValueError("'webhook_url' is required for the webhook reminder sink")
+        if "file" in self.sinks and not self.file_path:
+            raise ValueError("'file_path' is required for the file reminder sink")
+        return self
+
+
 class Config(BaseModel):
-    db: DB
+    db: DB | None = None
     api: Api
+    pagination: Pagination = Pagination()
+    export: Export = Export()
+    cache: Cache = Cache()
+    purge: Purge = Purge()
+    archive: Archive = Archive()
+    partitioning: Partitioning = Partitioning()
+    bulk_import: BulkImport = BulkImport()
+    slow_query_log: SlowQueryLog = SlowQueryLog()
+    storage: Storage = Storage()
+    rendering: Rendering = Rendering()
+    compression: Compression = Compression()
+    metrics: Metrics = Metrics()
+    notifications: Notifications = Notifications()
+    reminders: Reminders = Reminders()
+
+    @model_validator(mode="after")
+    def check_db(self):
+        if self.storage.backend == "postgres" and self.db is None:
+            raise ValueError("'db' section is required for the postgres storage backend")
+        return self
 
 
 def load_config(config_file: str = None):
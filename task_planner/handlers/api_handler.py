@@ -1,48 +1,114 @@
-from fastapi import APIRouter, Request
+import datetime
+
+import orjson
+from fastapi import APIRouter, Path, Query, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import ORJSONResponse, Response
 from loguru import logger
 
-from ..application.models import TasksCountResponse, TasksInfoResponse, TaskRequest, TaskInfo
+from ..application.models import (
+    TasksCountResponse,
+    TasksInfoResponse,
+    TaskRequest,
+    TaskInfo,
+    DeadlineBuckets,
+    CacheStatsResponse,
+    YearDensityResponse,
+    ImportResponse,
+    ImportRowError,
+    BatchRequest,
+    BatchResponse,
+    BatchResult,
+    RemindersResponse,
+)
 from ..application.benchmarking import measure_time
-from ..workers.db_worker import DBWorker
-from ..application.exceptions import TaskNotFoundError
+from ..application.importing import iter_import_rows, take_rows
+from ..application.conditional import make_etag, validator_headers, is_not_modified
+from ..workers.storage import Storage
+from ..application.exceptions import TaskNotFoundError, InvalidCursorError, TaskAlreadyExistsError
+
 
+TASK_INFO_FIELDS = ("id", "name", "deadline", "comment", "done")
 
 router = APIRouter(prefix="/api", responses={404: {"description": "Not found"}}, tags=["tasks"])
 
 
 @router.get('/tasks_count')
 @measure_time
-async def get_tasks_count(request: Request):
-    db_worker: DBWorker = request.app.state.db_worker
+async def get_tasks_count(request: Request,
+                          response: Response,
+                          name: str | None = None,
+                          done: bool | None = None,
+                          start_date: datetime.date | None = None,
+                          end_date: datetime.date | None = None):
+    db_worker: Storage = request.app.state.db_worker
+    table_version, modified_at = db_worker.table_validator()
+    headers = validator_headers(make_etag(table_version, datetime.date.today()), modified_at)
+    if is_not_modified(request, headers["ETag"], modified_at):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    from_date = datetime.datetime.combine(start_date, datetime.time.min) if start_date else None
+    to_date = datetime.datetime.combine(end_date, datetime.time.min) if end_date else None
     try:
-        all_tasks = await db_worker.get_tasks(for_calendar=True)
-        return TasksCountResponse(tasks_count=(len(all_tasks)))
+        counts = await db_worker.count_tasks(name=name.capitalize() if name else None, done=done,
+                                             from_date=from_date, to_date=to_date)
+        return TasksCountResponse(tasks_count=counts['total'],
+                                  done_count=counts['done'],
+                                  open_count=counts['open'],
+                                  deadline_buckets=DeadlineBuckets(**counts))
     except Exception as e:
         logger.error(f'Failed to get tasks: {e.__class__.__name__}, {e}')
         error_message = {"error": f"Ошибка приложения, не удалось получить задачи"}
         return ORJSONResponse(status_code=500, content=error_message)
 
 
-@router.get('/tasks_info')
+@router.get('/tasks_info', response_model=TasksInfoResponse)
 @measure_time
-async def get_tasks_info(request: Request):
-    db_worker: DBWorker = request.app.state.db_worker
+async def get_tasks_info(request: Request, limit: int | None = Query(None, ge=1), cursor: str | None = None):
+    db_worker: Storage = request.app.state.db_worker
+    table_version, modified_at = db_worker.table_validator()
+    headers = validator_headers(make_etag(table_version), modified_at)
+    if is_not_modified(request, headers["ETag"], modified_at):
+        return Response(status_code=304, headers=headers)
+    pagination = request.app.state.config.pagination
+    limit = min(limit or pagination.page_size, pagination.max_page_size)
     try:
-        all_tasks = await db_worker.get_tasks(for_calendar=True)
-        all_tasks = [TaskInfo.from_orm(i) for i in all_tasks]
-        return TasksInfoResponse(tasks_info=all_tasks)
+        rows, next_cursor = await db_worker.paginate_task_rows(limit=limit, cursor=cursor)
+        tasks_info = [dict(zip(TASK_INFO_FIELDS, row)) for row in rows]
+        content = orjson.dumps({"tasks_info": tasks_info, "next_cursor": next_cursor})
+        return Response(content=content, media_type="application/json", headers=headers)
+    except InvalidCursorError as e:
+        logger.error(e.reason)
+        return ORJSONResponse(status_code=422, content={"error": f"Wrong cursor {cursor}"})
     except Exception as e:
         logger.error(f'Failed to get tasks: {e.__class__.__name__}, {e}')
         error_message = {"error": f"Ошибка приложения, не удалось получить задачи"}
         return ORJSONResponse(status_code=500, content=error_message)
 
 
+@router.get('/tasks/search')
+@measure_time
+async def search_tasks(request: Request, q: str, limit: int | None = Query(None, ge=1), done: bool | None = None):
+    db_worker: Storage = request.app.state.db_worker
+    pagination = request.app.state.config.pagination
+    limit = min(limit or pagination.page_size, pagination.max_page_size)
+    try:
+        tasks = await db_worker.search_tasks(q, limit=limit, done=done)
+        return TasksInfoResponse(tasks_info=[TaskInfo.model_validate(task) for task in tasks])
+    except TaskNotFoundError:
+        return ORJSONResponse(status_code=404, content={"error": f"Tasks for {q} not found"})
+    except Exception as e:
+        logger.error(f'Failed to search tasks: {e.__class__.__name__}, {e}')
+        error_message = {"error": f"Ошибка приложения, не удалось найти задачи"}
+        return ORJSONResponse(status_code=500, content=error_message)
+
+
 @router.post('/task_info')
 async def get_task_info(request: Request, task_request: TaskRequest):
-    db_worker: DBWorker = request.app.state.db_worker
+    db_worker: Storage = request.app.state.db_worker
     try:
-        all_tasks = await db_worker.get_tasks(name=task_request.task_name.capitalize(), done=task_request.done)
+        all_tasks = await db_worker.get_tasks(name=task_request.task_name, done=task_request.done,
+                                             include_archived=task_request.include_archived)
         return TasksInfoResponse(tasks_info=all_tasks)
     except TaskNotFoundError:
         return ORJSONResponse(status_code=404, content={"error": f"Task {task_request.task_name} not found"})
@@ -52,9 +118,107 @@ async def get_task_info(request: Request, task_request: TaskRequest):
         return ORJSONResponse(status_code=500, content=error_message)
 
 
+@router.get('/year_density/{year}')
+@measure_time
+async def get_year_density(request: Request, year: int = Path(ge=1, le=9998), per_day: bool = False):
+    db_worker: Storage = request.app.state.db_worker
+    try:
+        density = await db_worker.get_year_density(year, per_day=per_day)
+        return YearDensityResponse(year=year, **density)
+    except Exception as e:
+        logger.error(f'Failed to get year density: {e.__class__.__name__}, {e}')
+        error_message = {"error": f"Ошибка приложения, не удалось получить задачи"}
+        return ORJSONResponse(status_code=500, content=error_message)
+
+
+@router.post('/tasks/import')
+@measure_time
+async def import_tasks(request: Request, file: UploadFile, file_format: str | None = None):
+    db_worker: Storage = request.app.state.db_worker
+    settings = request.app.state.config.bulk_import
+    if not file_format:
+        is_ndjson = (file.filename or '').endswith(('.ndjson', '.jsonl')) or file.content_type == 'application/x-ndjson'
+        file_format = 'ndjson' if is_ndjson else 'csv'
+    if file_format not in ('csv', 'ndjson'):
+        return ORJSONResponse(status_code=422, content={"error": f"Unknown file format {file_format}"})
+    imported, failed, errors, batch = 0, 0, [], []
+
+    async def merge_batch():
+        nonlocal imported, failed
+        results = await db_worker.import_tasks(batch)
+        for row_num, created in sorted(results.items()):
+            if created:
+                imported += 1
+            else:
+                failed += 1
+                if len(errors) < settings.max_errors:
+                    errors.append(ImportRowError(row=row_num, error="task with this name and deadline already exists"))
+        batch.clear()
+
+    try:
+        rows = iter_import_rows(file.file, file_format)
+        while parsed := await run_in_threadpool(take_rows, rows, settings.batch_size):
+            for row_num, record, error in parsed:
+                if error:
+                    failed += 1
+                    if len(errors) < settings.max_errors:
+                        errors.append(ImportRowError(row=row_num, error=error))
+                    continue
+                batch.append((row_num, *record))
+                if len(batch) >= settings.batch_size:
+                    await merge_batch()
+        if batch:
+            await merge_batch()
+    except Exception as e:
+        logger.error(f'Failed to import tasks: {e.__class__.__name__}, {e}')
+        error_message = {"error": f"Ошибка приложения, импорт прерван после {imported} задач"}
+        return ORJSONResponse(status_code=500, content=error_message)
+    logger.info(f'Imported {imported} tasks, {failed} rows failed')
+    return ImportResponse(imported=imported, failed=failed, errors=sorted(errors, key=lambda error: error.row))
+
+
+@router.post('/tasks/batch')
+@measure_time
+async def batch_tasks(request: Request, batch_request: BatchRequest):
+    db_worker: Storage = request.app.state.db_worker
+    updates = []
+    for changes in batch_request.update:
+        changes = changes.model_dump(exclude_none=True)
+        if 'deadline' in changes:
+            changes['deadline'] = datetime.datetime.combine(changes['deadline'], datetime.time.min)
+        updates.append(changes)
+    try:
+        results = await db_worker.batch_tasks(updates=updates, delete_ids=batch_request.delete)
+        return BatchResponse(results=[BatchResult(id=task_id, action=action, status=status)
+                                      for task_id, action, status in results])
+    except TaskAlreadyExistsError as e:
+        logger.error(e.reason)
+        return ORJSONResponse(status_code=409, content={"error": "Task with this name and deadline already exists"})
+    except Exception as e:
+        logger.error(f'Failed to apply batch: {e.__class__.__name__}, {e}')
+        error_message = {"error": f"Ошибка приложения, изменения не применены"}
+        return ORJSONResponse(status_code=500, content=error_message)
+
+
+@router.get('/cache_stats')
+async def get_cache_stats(request: Request):
+    db_worker: Storage = request.app.state.db_worker
+    return CacheStatsResponse(calendar=db_worker.calendar_cache.stats(),
+                              fragments=request.app.state.renderer.fragments.stats())
+
+
+@router.get('/reminders')
+async def get_reminders(request: Request, limit: int = 20):
+    reminders = request.app.state.reminders
+    if reminders is None:
+        return RemindersResponse(enabled=False, pending=0, reminders=[])
+    return RemindersResponse(enabled=True, pending=len(reminders.pending),
+                             reminders=[reminder.to_dict() for reminder in reminders.upcoming(limit)])
+
+
 @router.delete('/task/{task_id}')
 async def delete_task(request: Request, task_id: int):
-    db_worker: DBWorker = request.app.state.db_worker
+    db_worker: Storage = request.app.state.db_worker
     error = {"error": f"Application error, task {task_id} wasn't deleted"}
     try:
         all_tasks = await db_worker.get_tasks(task_id=task_id)
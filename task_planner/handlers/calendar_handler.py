@@ -1,29 +1,52 @@
 import datetime
-from fastapi import APIRouter
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, Query
+from fastapi.responses import HTMLResponse, Response
 from fastapi import Request
 
-from ..workers.db_worker import DBWorker
+from ..workers.storage import Storage
+from ..application.conditional import make_etag, validator_headers, is_not_modified
 
 router = APIRouter(responses={404: {"description": "Not found"}}, tags=["calendar"])
 
 
 @router.get("/year_calendar", response_class=HTMLResponse)
-async def year_calendar(request: Request):
-    year = datetime.datetime.now().year
-    months = request.app.state.months
-    return request.app.state.templates.TemplateResponse(
-        "year_calendar.html", {"request": request, "year": year, "months": months}
-    )
+async def year_calendar(request: Request, year: int | None = Query(None, ge=1, le=9998), heatmap: bool = False):
+    db_worker: Storage = request.app.state.db_worker
+    if year is None:
+        year = datetime.datetime.now().year
+    table_version, _ = db_worker.table_validator()
+
+    async def load_context():
+        density = await db_worker.get_year_density(year, per_day=heatmap)
+        max_day_total = max((counts["total"] for counts in (density["days"] or {}).values()), default=0)
+        return {
+            "year": year,
+            "months": request.app.state.months,
+            "density": density,
+            "heatmap": heatmap,
+            "max_day_total": max_day_total,
+        }
+
+    html = await request.app.state.renderer.fragment("year_calendar.html", (year, heatmap, table_version), load_context)
+    return HTMLResponse(html)
 
 
 @router.get("/read_calendar/{year}/{month}", response_class=HTMLResponse)
 async def read_calendar(request: Request, month: int = None, year: int = None):
-    db_worker: DBWorker = request.app.state.db_worker
+    db_worker: Storage = request.app.state.db_worker
+    month_version, modified_at = db_worker.month_validator(year, month)
+    headers = validator_headers(make_etag(month_version), modified_at)
+    if is_not_modified(request, headers["ETag"], modified_at):
+        return Response(status_code=304, headers=headers)
     month_name = request.app.state.months[month - 1]
-    days = await db_worker.generate_calendar(year, month)
+
+    async def load_context():
+        return {"days": await db_worker.generate_calendar(year, month)}
+
+    grid = await request.app.state.renderer.fragment("calendar_grid.html", month_version, load_context)
     return request.app.state.templates.TemplateResponse(
         "show_calendar.html",
-        {"request": request, "days": days, "month_name": month_name, "year": year},
+        {"request": request, "grid": grid, "month_name": month_name, "year": year, "month": month},
+        headers=headers,
     )
 
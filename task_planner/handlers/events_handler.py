@@ -0,0 +1,62 @@
+import asyncio
+
+import orjson
+from fastapi import APIRouter, Request, Query
+from fastapi.responses import StreamingResponse
+
+from ..application.metrics import SSE_CLIENTS
+from ..workers.storage import Storage
+
+router = APIRouter(tags=["events"])
+
+
+def server_sent_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+
+@router.get("/events")
+async def events(request: Request, month: list[str] | None = Query(None)):
+    """Server-Sent Events feed of task changes, optionally only for the given YYYY-MM deadline months.
+
+    A client that falls sse_queue_size events behind gets a resync event and is disconnected,
+    EventSource reconnects by itself.
+    """
+    db_worker: Storage = request.app.state.db_worker
+    settings = request.app.state.config.notifications
+    months = set(month or ())
+
+    async def stream():
+        queue: asyncio.Queue[dict | None] = asyncio.Queue(maxsize=settings.sse_queue_size)
+
+        def on_change(event: dict):
+            if months and not event.get("resync") and months.isdisjoint(event.get("months", ())):
+                return
+            if queue.full():
+                db_worker.unsubscribe(on_change)
+                queue.get_nowait()
+                queue.put_nowait(None)
+                return
+            queue.put_nowait(event)
+
+        db_worker.subscribe(on_change)
+        SSE_CLIENTS.inc()
+        try:
+            yield f"retry: {int(settings.reconnect_delay * 1000)}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.sse_heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None or event.get("resync"):
+                    yield server_sent_event("resync", {})
+                    if event is None:
+                        break
+                    continue
+                yield server_sent_event("change", event)
+        finally:
+            db_worker.unsubscribe(on_change)
+            SSE_CLIENTS.dec()
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,22 @@
+from typing import Callable
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from ..application.metrics import REGISTRY, DB_POOL_CONNECTIONS
+from ..workers.storage import Storage
+
+router = APIRouter(tags=["metrics"])
+
+
+def pool_collector(db_worker: Storage) -> Callable[[], None]:
+    """Collector refreshing the connection pool gauges of db_worker, see MetricsRegistry.add_collector."""
+    def collect():
+        for state, value in db_worker.pool_status().items():
+            DB_POOL_CONNECTIONS.set(value, state)
+    return collect
+
+
+@router.get('/metrics', include_in_schema=False)
+async def metrics():
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4")
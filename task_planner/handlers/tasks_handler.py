@@ -1,15 +1,18 @@
 import datetime
 import csv
-import os.path
+import io
+import zlib
 from loguru import logger
 from fastapi import APIRouter, Form, Request
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 
-from ..workers.db_worker import DBWorker
+from ..workers.storage import Storage
 from ..application.exceptions import (
     TaskNotFoundError,
     InvalidDateFormatError,
     NotFullDataError,
+    InvalidCursorError,
+    TaskAlreadyExistsError,
 )
 from ..application.utils import get_deadline
 from ..application.benchmarking import measure_time
@@ -19,23 +22,17 @@ router = APIRouter(responses={404: {"description": "Not found"}}, tags=["tasks"]
 
 @router.get("/", response_class=HTMLResponse, name="read_root")
 async def read_root(request: Request):
-    return request.app.state.templates.TemplateResponse(
-        "menu.html", {"request": request}
-    )
+    return request.app.state.renderer.page(request, "menu.html")
 
 
 @router.get("/search_task", response_class=HTMLResponse)
 async def search_task_page(request: Request):
-    return request.app.state.templates.TemplateResponse(
-        "search_task.html", {"request": request}
-    )
+    return request.app.state.renderer.page(request, "search_task.html")
 
 
 @router.get("/add_task_page", response_class=HTMLResponse)
 async def add_task_page(request: Request):
-    return request.app.state.templates.TemplateResponse(
-        "add_task.html", {"request": request}
-    )
+    return request.app.state.renderer.page(request, "add_task.html")
 
 
 @router.post("/add_task", response_class=HTMLResponse)
@@ -48,7 +45,7 @@ async def add_task(
     day: int = Form(...),
     comment: str = Form(...),
 ):
-    db_worker: DBWorker = request.app.state.db_worker
+    db_worker: Storage = request.app.state.db_worker
     name = name.capitalize()
     try:
         deadline = await get_deadline(year=year, month=month, day=day)
@@ -59,13 +56,6 @@ async def add_task(
                 {"request": request, "error_message": error_message},
                 status_code=422,
             )
-        tasks = await db_worker.get_tasks(name=name, from_date=deadline, to_date=deadline)
-        if tasks:
-            error_message = f"Задача с таким названием и сроком выполнения уже существует id {tasks[0].id}"
-            return request.app.state.templates.TemplateResponse(
-                "add_task.html", {"request": request, "error_message": error_message},
-                status_code=422,
-            )
     except (NotFullDataError, InvalidDateFormatError) as e:
         logger.error(e.reason)
         error_message = f"Вы ввели неправильное время: {year}-{month}-{day}"
@@ -74,21 +64,18 @@ async def add_task(
             {"request": request, "error_message": error_message},
             status_code=422,
         )
-    except Exception as e:
-        if e.__class__ != TaskNotFoundError:
-            logger.error(f"Failed to check task: {e.__class__.__name__}, {e}")
-            error_message = f"Ошибка приложения: {e}"
-            return request.app.state.templates.TemplateResponse(
-                "add_task.html",
-                {"request": request, "error_message": error_message},
-                status_code=404,
-            )
     try:
         await db_worker.add_task(name=name, comment=comment, deadline=deadline)
         message = "Задача добавлена"
         return request.app.state.templates.TemplateResponse(
             "add_task.html", {"request": request, "message": message}
         )
+    except TaskAlreadyExistsError as e:
+        error_message = f"Задача с таким названием и сроком выполнения уже существует id {e.task_id}"
+        return request.app.state.templates.TemplateResponse(
+            "add_task.html", {"request": request, "error_message": error_message},
+            status_code=422,
+        )
     except Exception as e:
         error_message = f"Не удалось сохранить задачу"
         logger.error(error_message + f" {e.__class__.__name__}, {e}")
@@ -101,9 +88,9 @@ async def add_task(
 
 @router.get("/show_task/{task_id}", response_class=HTMLResponse)
 async def show_task(request: Request, task_id: int):
-    db_worker: DBWorker = request.app.state.db_worker
+    db_worker: Storage = request.app.state.db_worker
     try:
-        task = await db_worker.get_tasks(task_id=task_id)
+        task = await db_worker.get_tasks(task_id=task_id, include_archived=True)
         return request.app.state.templates.TemplateResponse(
             "show_task.html", {"request": request, "task": task[0]}
         )
@@ -138,8 +125,16 @@ async def search_task(
     end_month: str | None = Form(None),
     end_day: str | None = Form(None),
     done: str | None = Form(None),
+    cursor: str | None = Form(None),
+    text: str | None = Form(None),
+    include_archived: str | None = Form(None),
 ):
-    db_worker: DBWorker = request.app.state.db_worker
+    db_worker: Storage = request.app.state.db_worker
+    search_filters = {
+        "name": name, "comment": comment, "done": done, "include_archived": include_archived,
+        "start_year": start_year, "start_month": start_month, "start_day": start_day,
+        "end_year": end_year, "end_month": end_month, "end_day": end_day,
+    }
     if name:
         name = name.capitalize()
     if done:
@@ -166,11 +161,29 @@ async def search_task(
             status_code=422,
         )
     try:
-        tasks = await db_worker.get_tasks(
-            name=name, from_date=from_date, to_date=to_date, comment=comment, done=done
+        if text:
+            tasks = await db_worker.search_tasks(
+                text, limit=request.app.state.config.pagination.page_size,
+                name=name, from_date=from_date, to_date=to_date, comment=comment, done=done
+            )
+            next_cursor = None
+        else:
+            tasks, next_cursor = await db_worker.paginate_tasks(
+                limit=request.app.state.config.pagination.page_size, cursor=cursor,
+                name=name, from_date=from_date, to_date=to_date, comment=comment, done=done,
+                include_archived=include_archived == "True"
+            )
+        return request.app.state.templates.TemplateResponse(
+            "show_tasks.html",
+            {"request": request, "tasks": tasks, "next_cursor": next_cursor, "search_filters": search_filters},
         )
+    except InvalidCursorError as e:
+        logger.error(e.reason)
+        error_message = f"Неверная ссылка на страницу результатов"
         return request.app.state.templates.TemplateResponse(
-            "show_tasks.html", {"request": request, "tasks": tasks}
+            "search_task.html",
+            {"request": request, "error_message": error_message},
+            status_code=422,
         )
     except TaskNotFoundError:
         logger.error("Tasks not found")
@@ -190,19 +203,69 @@ async def search_task(
         )
 
 
+CSV_HEADER = ["id", "Название", "Выполнить до", "Комментарий", "Выполнено"]
+
+
+async def csv_chunks(first_rows, rows_chunks, compress: bool = False):
+    """Closes rows_chunks however the download ends, so a client disconnect releases the cursor and its session."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    writer.writerow(CSV_HEADER)
+    rows = first_rows
+    try:
+        while rows:
+            for task_id, name, deadline, comment, done in rows:
+                writer.writerow([task_id, name, deadline.strftime("%Y-%m-%d"), comment, "Да" if done else "Нет"])
+            data = buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            yield compressor.compress(data) if compressor else data
+            rows = await anext(rows_chunks, None)
+    finally:
+        await rows_chunks.aclose()
+    if compressor:
+        yield compressor.flush()
+
+
 @router.get("/download", response_class=HTMLResponse, name="download")
-async def download(request: Request):
-    db_worker: DBWorker = request.app.state.db_worker
+async def download(
+    request: Request,
+    name: str | None = None,
+    comment: str | None = None,
+    start_year: str | None = None,
+    start_month: str | None = None,
+    start_day: str | None = None,
+    end_year: str | None = None,
+    end_month: str | None = None,
+    end_day: str | None = None,
+    done: str | None = None,
+    compress: bool = False,
+):
+    db_worker: Storage = request.app.state.db_worker
+    if name:
+        name = name.capitalize()
+    if done:
+        done = done == "True"
     try:
-        tasks = await db_worker.get_tasks()
-    except TaskNotFoundError:
-        error_message = "Не найдено задач для скачивания"
+        from_date = await get_deadline(start_year, start_month, start_day)
+        to_date = await get_deadline(end_year, end_month, end_day)
+    except (NotFullDataError, InvalidDateFormatError) as e:
+        logger.error(e.reason)
+        error_message = f"Вы ввели неправильное время поиска"
         return request.app.state.templates.TemplateResponse(
             "download.html",
             {"request": request, "error_message": error_message},
-            status_code=404,
+            status_code=422,
         )
+    rows_chunks = db_worker.stream_tasks(
+        chunk_size=request.app.state.config.export.chunk_size,
+        name=name, from_date=from_date, to_date=to_date, comment=comment, done=done,
+    )
+    try:
+        first_rows = await anext(rows_chunks, None)
     except Exception as e:
+        await rows_chunks.aclose()
         logger.error(f"Failed to get tasks to download: {e.__class__.__name__}, {e}")
         error_message = f"Ошибка при поиске задач - {e.__class__.__name__}, {e}"
         return request.app.state.templates.TemplateResponse(
@@ -210,44 +273,29 @@ async def download(request: Request):
             {"request": request, "error_message": error_message},
             status_code=500,
         )
-    csv_file = f'tasks_{datetime.datetime.now().strftime("%Y_%m_%d")}.csv'
-
-    with open(csv_file, "w", newline="", encoding="utf-8") as file:
-        writer = csv.writer(file)
-        writer.writerow(
-            [
-                "id",
-                "Название",
-                "Выполнить до",
-                "Комментарий",
-                "Выполнено",
-            ]
-        )
-        for task in tasks:
-            writer.writerow(
-                [
-                    task.id,
-                    task.name,
-                    task.deadline.strftime("%Y-%m-%d"),
-                    task.comment,
-                    "Да" if task.done else "Нет",
-                ]
-            )
-        response = FileResponse(
-            path=csv_file,
-            media_type="text/csv",
-            filename=os.path.basename(csv_file)
+    if not first_rows:
+        await rows_chunks.aclose()
+        error_message = "Не найдено задач для скачивания"
+        return request.app.state.templates.TemplateResponse(
+            "download.html",
+            {"request": request, "error_message": error_message},
+            status_code=404,
         )
-        response.headers["Content-Disposition"] = f"attachment; filename={os.path.basename(csv_file)}"
-
-        return response
+    csv_file = f'tasks_{datetime.datetime.now().strftime("%Y_%m_%d")}.csv'
+    media_type = "text/csv"
+    if compress:
+        csv_file += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        csv_chunks(first_rows, rows_chunks, compress=compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={csv_file}"},
+    )
 
 
 @router.get("/update_task", response_class=HTMLResponse)
 async def update_task(request: Request):
-    return request.app.state.templates.TemplateResponse(
-        "update_task.html", {"request": request}
-    )
+    return request.app.state.renderer.page(request, "update_task.html")
 
 
 @router.post("/update_task", response_class=HTMLResponse)
@@ -264,7 +312,7 @@ async def update_task(
     new_day: str | None = Form(None),
     done: str | None = Form(None),
 ):
-    db_worker: DBWorker = request.app.state.db_worker
+    db_worker: Storage = request.app.state.db_worker
     name = name.capitalize()
     try:
         deadline = await get_deadline(year=year, month=month, day=day)
@@ -296,6 +344,14 @@ async def update_task(
             "show_task.html",
             {"request": request, "task": task, "message": "Задача обновлена"},
         )
+    except TaskAlreadyExistsError:
+        logger.error(f"Task with name {name} and deadline {new_deadline} already exists")
+        error_message = f"Задача с названием {name} и таким сроком выполнения уже существует"
+        return request.app.state.templates.TemplateResponse(
+            "update_task.html",
+            {"request": request, "error_message": error_message},
+            status_code=422,
+        )
     except TaskNotFoundError:
         logger.error(f"Task with name {name} wasn't found")
         error_message = f"Задача с названием {name} не найдена"
@@ -316,9 +372,7 @@ async def update_task(
 
 @router.get("/delete_task")
 async def delete_task(request: Request):
-    return request.app.state.templates.TemplateResponse(
-        "delete_task.html", {"request": request}
-    )
+    return request.app.state.renderer.page(request, "delete_task.html")
 
 
 @router.post("/delete_task")
@@ -331,7 +385,7 @@ async def delete_task(
     day: str | None = Form(None),
     done: str | None = Form(None),
 ):
-    db_worker: DBWorker = request.app.state.db_worker
+    db_worker: Storage = request.app.state.db_worker
     if done and eval(done):
         try:
             await db_worker.delete_done_tasks()
@@ -395,22 +449,55 @@ async def delete_task(
 
 
 @router.get("/show_tasks/{date}")
-async def show_tasks(request: Request, date: str):
+async def show_tasks(request: Request, date: str, cursor: str | None = None):
     db_worker = request.app.state.db_worker
-    date = datetime.datetime.strptime(date, "%Y-%m-%d")
-    tasks = await db_worker.get_tasks(from_date=date, to_date=date)
-    return request.app.state.templates.TemplateResponse(
-        "show_tasks.html", {"request": request, "tasks": tasks}
-    )
+    try:
+        date = datetime.datetime.strptime(date, "%Y-%m-%d")
+        tasks, next_cursor = await db_worker.paginate_tasks(
+            limit=request.app.state.config.pagination.page_size, cursor=cursor, from_date=date, to_date=date
+        )
+        return request.app.state.templates.TemplateResponse(
+            "show_tasks.html", {"request": request, "tasks": tasks, "next_cursor": next_cursor}
+        )
+    except InvalidCursorError as e:
+        logger.error(e.reason)
+        error_message = f"Неверная ссылка на страницу задач"
+        return request.app.state.templates.TemplateResponse(
+            "show_tasks.html", {"request": request, "error_message": error_message},
+            status_code=422
+        )
+    except TaskNotFoundError:
+        logger.error(f"No tasks found for {date}")
+        error_message = f"На этот день задач нет"
+        return request.app.state.templates.TemplateResponse(
+            "show_tasks.html", {"request": request, "error_message": error_message},
+            status_code=404
+        )
+    except Exception as e:
+        logger.error(f'Failed to get tasks for {date}: {e.__class__.__name__}, {e}')
+        error_message = f"Ошибка приложения, не удалось получить задачи"
+        return request.app.state.templates.TemplateResponse(
+            "show_tasks.html", {"request": request, "error_message": error_message},
+            status_code=500
+        )
 
 
 @router.get("/get_all_tasks")
-async def get_all_tasks(request: Request):
-    db_worker: DBWorker = request.app.state.db_worker
+async def get_all_tasks(request: Request, cursor: str | None = None):
+    db_worker: Storage = request.app.state.db_worker
     try:
-        all_tasks = await db_worker.get_tasks()
+        all_tasks, next_cursor = await db_worker.paginate_tasks(
+            limit=request.app.state.config.pagination.page_size, cursor=cursor
+        )
         return request.app.state.templates.TemplateResponse(
-            "show_tasks.html", {"request": request, "tasks": all_tasks}
+            "show_tasks.html", {"request": request, "tasks": all_tasks, "next_cursor": next_cursor}
+        )
+    except InvalidCursorError as e:
+        logger.error(e.reason)
+        error_message = f"Неверная ссылка на страницу задач"
+        return request.app.state.templates.TemplateResponse(
+            "show_tasks.html", {"request": request, "error_message": error_message},
+            status_code=422
         )
     except TaskNotFoundError:
         logger.error(f"No tasks found")
@@ -4,14 +4,21 @@ import uvicorn
 from fastapi import FastAPI, Depends
 from contextlib import asynccontextmanager
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 import sys
 from loguru import logger
 
 from task_planner.configs.config import load_config
-from task_planner.handlers import tasks_handler, calendar_handler, api_handler
-from task_planner.workers.db_worker import DBWorker
-from task_planner.application.middlewares import basic_auth
+from task_planner.handlers import tasks_handler, calendar_handler, api_handler, metrics_handler, events_handler
+from task_planner.workers.storage import create_storage
+from task_planner.workers.scheduler import create_scheduler
+from task_planner.workers.reminders import ReminderScheduler
+from task_planner.application.middlewares import basic_auth, MetricsMiddleware, ReadYourWritesMiddleware
+from task_planner.application.compression import CompressionMiddleware
+from task_planner.application.rendering import Renderer
+from task_planner.application.benchmarking import StartupReport
+from task_planner.application.metrics import REGISTRY
+
+STATIC_PAGES = ("menu.html", "search_task.html", "add_task.html", "update_task.html", "delete_task.html")
 
 
 @asynccontextmanager
@@ -20,23 +27,54 @@ async def lifespan(app: FastAPI):
     debug_flag = os.getenv('DEBUG', '').lower() in ('true', '1', 'yes')
     log_level = 'DEBUG' if debug_flag else 'INFO'
     logger.add(sys.stdout, level=log_level)
-    app.mount("/static", StaticFiles(directory=os.getenv("STATIC_DIR", "task_planner/static")), name="static")
-    app.state.templates = Jinja2Templates(directory=os.getenv("TEMPLATES_DIR", "task_planner/templates"))
-    app.state.config = load_config()
-    middleware_deps = [Depends(basic_auth(app.state.config.api.login, app.state.config.api.password))]
-    for handler in (tasks_handler, calendar_handler):
-        app.include_router(handler.router)
-    app.include_router(api_handler.router, dependencies=middleware_deps)
-    app.state.db_worker = DBWorker(app.state.config)
-    await app.state.db_worker.init()
+    report = StartupReport()
+    with report.phase("config"):
+        app.state.config = load_config()
+    with report.phase("routes"):
+        app.mount("/static", StaticFiles(directory=os.getenv("STATIC_DIR", "task_planner/static")), name="static")
+        middleware_deps = [Depends(basic_auth(app.state.config.api.login, app.state.config.api.password))]
+        for handler in (tasks_handler, calendar_handler, events_handler):
+            app.include_router(handler.router)
+        app.include_router(api_handler.router, dependencies=middleware_deps)
+        app.include_router(metrics_handler.router,
+                           dependencies=[] if app.state.config.metrics.public else middleware_deps)
+    with report.phase("templates"):
+        templates_dir = os.getenv("TEMPLATES_DIR", "task_planner/templates")
+        app.state.renderer = Renderer(app, templates_dir, app.state.config.rendering)
+        app.state.templates = app.state.renderer.templates
+        app.state.renderer.compile_templates()
+        app.state.renderer.prerender(*STATIC_PAGES)
+    with report.phase("storage"):
+        app.state.db_worker = create_storage(app.state.config)
+        await app.state.db_worker.init()
+        pool_metrics = metrics_handler.pool_collector(app.state.db_worker)
+        REGISTRY.add_collector(pool_metrics)
+    with report.phase("notifications"):
+        await app.state.db_worker.start_listener()
     app.state.months = [
         "Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
         "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"
     ]
+    with report.phase("scheduler"):
+        app.state.scheduler = create_scheduler(app.state.config, app.state.db_worker)
+        app.state.scheduler.start()
+    app.state.reminders = None
+    if app.state.config.reminders.enabled:
+        with report.phase("reminders"):
+            app.state.reminders = ReminderScheduler(app.state.config, app.state.db_worker)
+            await app.state.reminders.start()
+    report.log()
     yield
+    app.state.scheduler.shutdown(wait=False)
+    if app.state.reminders:
+        await app.state.reminders.close()
     await app.state.db_worker.close()
+    REGISTRY.remove_collector(pool_metrics)
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
 
 if __name__ == '__main__':
     try:
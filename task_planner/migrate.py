@@ -0,0 +1,48 @@
+"""Brings the database schema to the version the application expects.
+
+    python -m task_planner.migrate [--config CONFIG_FILE] [--no-create-database] [--partition]
+        [--move-conflicts]
+
+Run it once per deploy before starting the application workers. --partition additionally rebuilds
+the tasks table as partitioned by deadline month, once; stop the workers for that run. A migration
+blocked by conflicting rows (e.g. duplicate tasks before the unique index) fails listing them;
+--move-conflicts moves them into a holding table instead.
+"""
+import argparse
+import asyncio
+import sys
+
+from loguru import logger
+
+from task_planner.application.exceptions import MigrationError
+from task_planner.configs.config import load_config
+from task_planner.workers.migrations import migrate, partition_tasks, LATEST_VERSION
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m task_planner.migrate", description=__doc__.splitlines()[0])
+    parser.add_argument("--config", help="config file, CONFIG_FILE environment variable by default")
+    parser.add_argument("--no-create-database", action="store_true", help="do not try CREATE DATABASE first")
+    parser.add_argument("--partition", action="store_true", help="partition the tasks table by deadline month")
+    parser.add_argument("--move-conflicts", action="store_true",
+                        help="move rows blocking a migration into a holding table instead of failing")
+    args = parser.parse_args()
+    config = load_config(args.config)
+    if config.storage.backend != "postgres":
+        logger.info(f"Storage backend {config.storage.backend} has no schema to migrate")
+        return
+    try:
+        version = asyncio.run(migrate(config, create_db=not args.no_create_database,
+                                      resolve_conflicts=args.move_conflicts))
+    except MigrationError as e:
+        logger.error(e.reason)
+        sys.exit(1)
+    if version != LATEST_VERSION:
+        logger.error(f"Schema version {version} is not the expected {LATEST_VERSION}")
+        sys.exit(1)
+    if args.partition:
+        asyncio.run(partition_tasks(config))
+
+
+if __name__ == '__main__':
+    main()
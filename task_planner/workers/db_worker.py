@@ -1,147 +1,586 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from loguru import logger
-from sqlalchemy.orm import sessionmaker
 from sqlalchemy.future import select
-import calendar
-import asyncpg
+from sqlalchemy import func, and_, or_, tuple_, delete, update, text, any_, bindparam, union_all, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+import asyncio
 import datetime
+import re
+from typing import Callable
+
+import asyncpg
+import orjson
 
-from task_planner.application.models import Base, Task
+from task_planner.application.models import Task, ArchivedTask
+from task_planner.application.benchmarking import measure_time
 from task_planner.configs.config import Config
-from task_planner.application.exceptions import TaskNotFoundError
+from task_planner.application.exceptions import TaskNotFoundError, TaskAlreadyExistsError, SchemaVersionError
+from task_planner.workers.query_log import QueryLogger
+from task_planner.workers.storage import Storage, change_event
+from task_planner.workers.notifications import ChangeListener
+from task_planner.workers.replicas import ReadRouter, ReadTarget, is_unavailable
+from task_planner.workers.migrations import (schema_version, database_url, connect, is_partitioned,
+                                             create_month_partitions, month_start, LATEST_VERSION)
+
 
+TRIGRAM_INDEX_EXISTS = text("SELECT to_regclass('ix_tasks_data_name_trgm')")
+NOTIFY_CHANGE = text("SELECT pg_notify(:channel, :payload)")
+# A bigint advisory lock key is split into classid (high 32 bits) and objid (low 32 bits).
+HOLDS_ADVISORY_LOCK = """
+    SELECT EXISTS (
+        SELECT 1 FROM pg_locks
+        WHERE locktype = 'advisory' AND granted AND pid = pg_backend_pid() AND objsubid = 1
+          AND (classid::bigint << 32 | objid::bigint) = $1
+    )
+"""
+IMPORT_STAGING_TABLE = 'tasks_import_staging'
+IMPORT_STAGING_COLUMNS = ('row_num', 'name', 'deadline', 'comment', 'done')
+CREATE_IMPORT_STAGING = text(f"""
+    CREATE TEMP TABLE IF NOT EXISTS {IMPORT_STAGING_TABLE} (
+        row_num integer,
+        name varchar,
+        deadline timestamp,
+        comment text,
+        done boolean
+    ) ON COMMIT DELETE ROWS
+""")
+MERGE_IMPORT_STAGING = text(f"""
+    WITH firsts AS (
+        SELECT DISTINCT ON (name, deadline) row_num, name, deadline, comment, done
+        FROM {IMPORT_STAGING_TABLE}
+        ORDER BY name, deadline, row_num
+    ), inserted AS (
+        INSERT INTO tasks_data (name, deadline, comment, done)
+        SELECT name, deadline, comment, done FROM firsts
+        ON CONFLICT (name, deadline) DO NOTHING
+        RETURNING id, name, deadline
+    )
+    SELECT s.row_num, s.deadline, i.id AS task_id, i.name IS NOT NULL AS created
+    FROM {IMPORT_STAGING_TABLE} s
+    LEFT JOIN firsts f ON f.row_num = s.row_num
+    LEFT JOIN inserted i ON f.row_num IS NOT NULL AND i.name = s.name AND i.deadline = s.deadline
+""")
+# The repeated deadline condition lets Postgres skip the partitions of later months.
+ARCHIVE_DONE_TASKS = text("""
+    WITH moved AS (
+        DELETE FROM tasks_data
+        WHERE deadline < :older_than AND id IN (
+            SELECT id FROM tasks_data
+            WHERE done AND deadline < :older_than
+            ORDER BY deadline, id
+            LIMIT :batch_size
+        )
+        RETURNING id, name, deadline, comment, done
+    ), archived AS (
+        INSERT INTO tasks_archive (id, name, deadline, comment, done)
+        SELECT id, name, deadline, comment, done FROM moved
+    )
+    SELECT id, deadline FROM moved
+""")
 
-class DBWorker:
+
+class DBWorker(Storage):
     def __init__(self, config: Config):
-        self.config = config
+        super().__init__(config)
         self.engine = None
-        self.session = None
-        self.url = f"postgresql+asyncpg://{config.db.user}:{config.db.password}@{config.db.host}/{config.db.db_name}"
-
-    async def create_database(self):
-        conn = await asyncpg.connect(user=self.config.db.user,
-                                     password=self.config.db.password,
-                                     host=self.config.db.host,
-                                     port=self.config.db.port)
-        try:
-            await conn.execute(f"CREATE DATABASE {self.config.db.db_name}")
-            logger.info(f'DB {self.config.db.db_name} create')
-        except asyncpg.exceptions.DuplicateDatabaseError:
-            print(f'DB {self.config.db.db_name} already exists')
-        finally:
-            await conn.close()
+        self.session_maker = None
+        self.query_loggers = []
+        self.reads = None
+        self.trigram_search = False
+        self.listener = None
+        self.lock_connections: dict[int, asyncpg.Connection] = {}
+        self.url = database_url(config)
 
-    async def create_tables(self):
-        async with self.engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+    def _create_engine(self, url: str):
+        engine = create_async_engine(
+            url=url,
+            pool_size=self.config.db.pool_size,
+            max_overflow=self.config.db.max_overflow,
+            pool_timeout=self.config.db.pool_timeout,
+            pool_pre_ping=self.config.db.pool_pre_ping,
+            connect_args={"prepared_statement_cache_size": self.config.db.statement_cache_size},
+        )
+        self.query_loggers.append(QueryLogger(engine, self.config.slow_query_log))
+        return engine
 
     async def init(self):
-        await self.create_database()
+        """Connects and checks that the schema was migrated; DDL is run by python -m task_planner.migrate."""
+        self.engine = self._create_engine(self.url)
+        self.session_maker = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+        replicas = []
+        for replica in self.config.db.replicas:
+            engine = self._create_engine(database_url(self.config, replica.host, replica.port))
+            replicas.append(ReadTarget(f'{replica.host}:{replica.port}', engine,
+                                       async_sessionmaker(bind=engine, expire_on_commit=False), replica.weight))
+        self.reads = ReadRouter(self.config.db, ReadTarget('primary', self.engine, self.session_maker), replicas)
+        async with self.engine.connect() as conn:
+            version = await schema_version(conn)
+            self.trigram_search = (await conn.execute(TRIGRAM_INDEX_EXISTS)).scalar() is not None
+            self.partitioned = await is_partitioned(conn)
+        if version != LATEST_VERSION:
+            raise SchemaVersionError(reason=f'DB schema version is {version}, expected {LATEST_VERSION}: '
+                                            f'run python -m task_planner.migrate')
+        if self.partitioned:
+            await self.create_partitions()
+        if not self.trigram_search:
+            logger.warning('pg_trgm index is missing, fuzzy name search is disabled')
+        await self.reads.start()
+        if replicas:
+            logger.info(f'Reads are routed to replicas {", ".join(replica.name for replica in replicas)}')
+        logger.info(f'----- DB worker initialized, schema version {version} -----')
+
+    async def _read(self, query, consume: Callable, bare: bool = False, primary: bool = False):
+        """Runs a read-only query where the router sends it and returns consume(result). A replica that
+        cannot be reached is taken out of rotation and the query is repeated on the primary.
+        bare runs the query on a connection instead of an ORM session."""
+        target = self.reads.choose(primary=primary)
         try:
-            url = self.url
-            self.engine = create_async_engine(url=url, echo=True)
-            self.session = sessionmaker(bind=self.engine, class_=AsyncSession, expire_on_commit=False)()
-            logger.info('DB connection created')
-            await self.create_tables()
-            logger.info('Tables created')
-            logger.info('----- DB worker initialized -----')
+            return await self._execute(target, query, consume, bare)
         except Exception as e:
-            logger.error(f'Failed to init DB: {e.__class__.__name__}: {e}')
+            if target is self.reads.primary or not is_unavailable(e):
+                raise
+            self.reads.mark_down(target, e)
+        return await self._execute(self.reads.choose(primary=True), query, consume, bare)
+
+    @staticmethod
+    async def _execute(target: ReadTarget, query, consume: Callable, bare: bool):
+        if bare:
+            async with target.engine.connect() as conn:
+                return consume(await conn.execute(query))
+        async with target.session_maker() as session:
+            return consume(await session.execute(query))
+
+    def _changed_recently(self, from_date: datetime.datetime, to_date: datetime.datetime) -> bool:
+        """Whether a month starting in [from_date, to_date) was written within the read-your-writes window,
+        so a replica may still miss the change."""
+        horizon = (datetime.datetime.now(datetime.timezone.utc)
+                   - datetime.timedelta(seconds=self.config.db.read_your_writes_seconds + 1))
+        return any(changed_at >= horizon and from_date <= datetime.datetime(year, month, 1) < to_date
+                   for (year, month), changed_at in self.months_modified.items())
+
+    def _table_changed_recently(self) -> bool:
+        """Whether the table validator changed within the read-your-writes window. Reads answered under
+        that validator go to the primary, otherwise a lagging replica could serve old rows under the new ETag
+        and clients would keep them through 304 responses until the next write."""
+        horizon = (datetime.datetime.now(datetime.timezone.utc)
+                   - datetime.timedelta(seconds=self.config.db.read_your_writes_seconds + 1))
+        return self.modified_at >= horizon
+
+    async def start_listener(self):
+        if self.config.notifications.enabled:
+            self.listener = ChangeListener(self.config, self)
+            await self.listener.start()
+
+    async def acquire_lock(self, lock_id: int, on_lost: Callable[[], None] | None = None) -> bool:
+        """Takes a session-level advisory lock on a dedicated connection kept until close(),
+        so only one of the processes sharing the database holds it. Postgres releases the lock when
+        the connection drops, on_lost is called then."""
+        conn = await connect(self.config)
+        if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", lock_id):
+            await conn.close()
+            return False
+        self.lock_connections[lock_id] = conn
+
+        def connection_lost(connection):
+            if self.lock_connections.get(lock_id) is connection:
+                del self.lock_connections[lock_id]
+                logger.warning(f'Connection holding advisory lock {lock_id} is lost')
+                if on_lost:
+                    on_lost()
+        conn.add_termination_listener(connection_lost)
+        return True
+
+    async def holds_lock(self, lock_id: int) -> bool:
+        """Checks on the lock connection that the advisory lock is still granted. A connection that does not
+        answer within pool_timeout is terminated, as its session may be gone without the socket noticing."""
+        conn = self.lock_connections.get(lock_id)
+        if conn is None or conn.is_closed():
+            return False
+        try:
+            async with asyncio.timeout(self.config.db.pool_timeout):
+                return await conn.fetchval(HOLDS_ADVISORY_LOCK, lock_id)
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+            logger.warning(f'Failed to check advisory lock {lock_id}: {e.__class__.__name__}, {e}')
+            conn.terminate()
+            return False
+
+    async def create_partitions(self) -> int:
+        """Creates the missing deadline month partitions from the current month to months_ahead."""
+        if not self.partitioned:
+            return 0
+        today = datetime.date.today()
+        async with self.engine.begin() as conn:
+            created = await create_month_partitions(conn, today,
+                                                    month_start(today, self.config.partitioning.months_ahead))
+        if created:
+            logger.info(f'Created {created} task partitions')
+        return created
+
+    async def _notify(self, session, ids: list[int], deadlines: list[datetime.datetime | None]):
+        """Sends the change event to the other workers with NOTIFY inside the write transaction,
+        so Postgres delivers it only if the transaction commits."""
+        if not self.config.notifications.enabled:
+            return
+        event = change_event(self.worker_id, ids, deadlines)
+        if event["months"]:
+            payload = orjson.dumps(event).decode()
+            await session.execute(NOTIFY_CHANGE, {"channel": self.config.notifications.channel, "payload": payload})
+
+    @staticmethod
+    def _filter_query(query,
+                      name: str | None = None,
+                      task_id: int | None = None,
+                      task_ids: list[int] | None = None,
+                      from_date: datetime.datetime | None = None,
+                      to_date: datetime.datetime | None = None,
+                      comment: str | None = None,
+                      done: bool | None = None,
+                      model=Task):
+        if task_id:
+            query = query.where(model.id == task_id)
+        if task_ids is not None:
+            query = query.where(model.id == any_(bindparam('task_ids', task_ids, type_=ARRAY(Integer))))
+        if done is not None:
+            query = query.where(model.done == done)
+        if name:
+            query = query.where(func.lower(model.name) == name.lower())
+        if comment:
+            query = query.where(model.comment == comment)
+        if from_date:
+            query = query.where(model.deadline >= from_date)
+        if to_date:
+            query = query.where(model.deadline <= to_date)
+        return query
 
+    @measure_time
     async def get_tasks(self,
                         name: str | None = None,
                         task_id: int | None = None,
+                        task_ids: list[int] | None = None,
                         from_date: datetime.datetime | None = None,
                         to_date: datetime.datetime | None = None,
                         comment: str | None = None,
                         done: bool | None = None,
-                        for_calendar: bool = False) -> list[Task]:
-        query = select(Task)
-        if task_id:
-            query = query.where(Task.id == task_id)
-        if done is not None:
-            query = query.where(Task.done == done)
-        if name:
-            query = query.where(Task.name == name)
-        if comment:
-            query = query.where(Task.comment == comment)
-        if from_date:
-            query = query.where(Task.deadline >= from_date)
-        if to_date:
-            query = query.where(Task.deadline <= to_date)
-        async with self.session as session:
-            result = await session.execute(query)
-            tasks = result.scalars().all()
+                        for_calendar: bool = False,
+                        limit: int | None = None,
+                        after: tuple[datetime.datetime, int] | None = None,
+                        include_archived: bool = False) -> list[Task]:
+        filters = dict(name=name, task_id=task_id, task_ids=task_ids,
+                       from_date=from_date, to_date=to_date, comment=comment, done=done)
+        if include_archived:
+            tasks = await self._get_tasks_with_archive(limit, after, **filters)
+        else:
+            query = self._filter_query(select(Task), **filters)
+            if after:
+                query = query.where(tuple_(Task.deadline, Task.id) > tuple_(*after))
+            if limit:
+                query = query.order_by(Task.deadline, Task.id).limit(limit)
+            tasks = await self._read(query, lambda result: result.scalars().all())
         if not tasks and not for_calendar:
             raise TaskNotFoundError(reason=f'Task {task_id} not found')
         return tasks
 
-    async def add_task(self, name: str, deadline: datetime, comment: str):
-        new_task = Task(name=name, deadline=deadline, comment=comment)
-        self.session.add(new_task)
-        await self.session.commit()
+    async def _get_tasks_with_archive(self,
+                                      limit: int | None,
+                                      after: tuple[datetime.datetime, int] | None,
+                                      **filters) -> list[Task]:
+        """UNION ALL of the live and the archived tasks; the keyset condition and the limit are applied
+        to each side too, so both read only one page from their (deadline, id) index."""
+        branches = []
+        for model in (Task, ArchivedTask):
+            branch = self._filter_query(select(model.id, model.name, model.deadline, model.comment, model.done),
+                                        model=model, **filters)
+            if after:
+                branch = branch.where(tuple_(model.deadline, model.id) > tuple_(*after))
+            if limit:
+                branch = branch.order_by(model.deadline, model.id).limit(limit)
+            branches.append(branch)
+        tasks = union_all(*branches).subquery()
+        query = select(tasks)
+        if limit:
+            query = query.order_by(tasks.c.deadline, tasks.c.id).limit(limit)
+        rows = await self._read(query, lambda result: result.all())
+        return [Task(id=row.id, name=row.name, deadline=row.deadline, comment=row.comment, done=row.done)
+                for row in rows]
+
+    @measure_time
+    async def get_task_rows(self,
+                            limit: int,
+                            after: tuple[datetime.datetime, int] | None = None,
+                            **filters) -> list[tuple]:
+        """Runs a column select on a bare connection: no ORM objects and no identity map."""
+        query = self._filter_query(select(Task.id, Task.name, Task.deadline, Task.comment, Task.done), **filters)
+        if after:
+            query = query.where(tuple_(Task.deadline, Task.id) > tuple_(*after))
+        query = query.order_by(Task.deadline, Task.id).limit(limit)
+        return await self._read(query, lambda result: [tuple(row) for row in result], bare=True,
+                                primary=self._table_changed_recently())
+
+    async def stream_tasks(self, chunk_size: int = 1000, **filters):
+        """Yields lists of (id, name, deadline, comment, done) rows read from a server-side cursor.
+        The stream stays on the database it started on, it does not fail over."""
+        query = self._filter_query(select(Task.id, Task.name, Task.deadline, Task.comment, Task.done), **filters)
+        query = query.order_by(Task.deadline, Task.id).execution_options(yield_per=chunk_size)
+        async with self.reads.choose().session_maker() as session:
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                yield rows
+
+    @measure_time
+    async def search_tasks(self, search_text: str, limit: int, **filters) -> list[Task]:
+        """Ranked search: full-text prefix match on name and comment plus trigram similarity on name."""
+        words = re.findall(r'\w+', search_text)
+        if not words:
+            raise TaskNotFoundError(reason=f'Nothing to search in {search_text!r}')
+        ts_query = func.to_tsquery('simple', ' & '.join(f'{word}:*' for word in words))
+        condition = Task.search_vector.op('@@')(ts_query)
+        rank = func.ts_rank(Task.search_vector, ts_query)
+        if self.trigram_search:
+            condition = or_(condition, Task.name.op('%')(search_text))
+            rank = rank + func.similarity(Task.name, search_text)
+        query = self._filter_query(select(Task).where(condition), **filters)
+        query = query.order_by(rank.desc(), Task.deadline, Task.id).limit(limit)
+        tasks = await self._read(query, lambda result: result.scalars().all())
+        if not tasks:
+            raise TaskNotFoundError(reason=f'Tasks for {search_text!r} not found')
+        return tasks
+
+    @measure_time
+    async def count_tasks(self,
+                          name: str | None = None,
+                          from_date: datetime.datetime | None = None,
+                          to_date: datetime.datetime | None = None,
+                          done: bool | None = None) -> dict[str, int]:
+        """Counts tasks with one aggregate query: total, by status and open tasks by deadline bucket."""
+        today = datetime.datetime.combine(datetime.date.today(), datetime.time.min)
+        tomorrow = today + datetime.timedelta(days=1)
+        week_end = today + datetime.timedelta(days=7)
+        is_open = Task.done.is_not(True)
+        query = select(
+            func.count().label('total'),
+            func.count().filter(Task.done.is_(True)).label('done'),
+            func.count().filter(is_open).label('open'),
+            func.count().filter(and_(is_open, Task.deadline < today)).label('overdue'),
+            func.count().filter(and_(is_open, Task.deadline >= today, Task.deadline < tomorrow)).label('today'),
+            func.count().filter(and_(is_open, Task.deadline >= tomorrow, Task.deadline < week_end)).label('week'),
+            func.count().filter(and_(is_open, Task.deadline >= week_end)).label('later'),
+        ).select_from(Task)
+        query = self._filter_query(query, name=name, from_date=from_date, to_date=to_date, done=done)
+        row = await self._read(query, lambda result: result.one(), primary=self._table_changed_recently())
+        return dict(row._mapping)
 
-    async def generate_calendar(self, year: int, month: int) -> dict[str, Task]:
-        last_day = calendar.monthrange(year, month)[1]
-        from_date = datetime.datetime(year=year, month=month, day=1)
-        to_date=datetime.datetime(year=year, month=month, day=last_day)
-        last_day = calendar.monthrange(year, month)[1]
-        days = {f"{year}-{month:02d}-{day:02d}": [] for day in range(1, last_day + 1)}
-        tasks_for_month = await self.get_tasks(from_date=from_date, to_date=to_date, for_calendar=True)
+    @measure_time
+    async def add_task(self, name: str, deadline: datetime.datetime, comment: str) -> int:
+        """Inserts a task with INSERT ... ON CONFLICT on (name, deadline) and returns its id."""
+        query = (
+            insert(Task)
+            .values(name=name, deadline=deadline, comment=comment, done=False)
+            .on_conflict_do_nothing(index_elements=[Task.name, Task.deadline])
+            .returning(Task.id)
+        )
+        async with self.session_maker() as session, session.begin():
+            task_id = (await session.execute(query)).scalar_one_or_none()
+            if task_id is None:
+                existing = await session.execute(select(Task.id).where(Task.name == name, Task.deadline == deadline))
+                existing_id = existing.scalar_one_or_none()
+                raise TaskAlreadyExistsError(reason=f'Task {name} {deadline} already exists', task_id=existing_id)
+            await self._notify(session, [task_id], [deadline])
+        self.mark_changed(deadline, ids=[task_id])
+        return task_id
 
-        for task in tasks_for_month:
-            date = task.deadline.strftime("%Y-%m-%d")
-            days[date].append(task)
+    @measure_time
+    async def import_tasks(self, records: list[tuple]) -> dict[int, bool]:
+        """COPYs (row_num, name, deadline, comment, done) records into a staging table and merges them
+        into tasks_data in one transaction. Returns row_num -> whether the row was inserted."""
+        async with self.session_maker() as session, session.begin():
+            await session.execute(CREATE_IMPORT_STAGING)
+            connection = await session.connection()
+            raw_connection = await connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                IMPORT_STAGING_TABLE, records=records, columns=IMPORT_STAGING_COLUMNS
+            )
+            rows = (await session.execute(MERGE_IMPORT_STAGING)).all()
+            created = [row for row in rows if row.created]
+            await self._notify(session, [row.task_id for row in created], [row.deadline for row in created])
+        self.mark_changed(*(row.deadline for row in created), ids=(row.task_id for row in created))
+        return {row.row_num: row.created for row in rows}
 
-        return days
+    @measure_time
+    async def batch_tasks(self,
+                          updates: list[dict] | None = None,
+                          delete_ids: list[int] | None = None) -> list[tuple[int, str, str]]:
+        """Applies groups of field changes ({"ids": [...], "done"/"deadline"/"comment": ...}) with
+        UPDATE ... WHERE id = ANY(...) and deletes with DELETE ... RETURNING, all in one transaction.
+        Returns (id, action, status) for every requested id in request order."""
+        tasks = Task.__table__
+        old = tasks.alias('old')
+        results, deadlines, changed_ids = [], [], []
+        try:
+            async with self.session_maker() as session, session.begin():
+                for changes in updates or []:
+                    ids = changes['ids']
+                    values = {key: value for key, value in changes.items() if key != 'ids'}
+                    query = (
+                        update(tasks)
+                        .where(tasks.c.id == old.c.id, old.c.id == any_(bindparam('ids', ids, type_=ARRAY(Integer))))
+                        .values(**values)
+                        .returning(tasks.c.id, old.c.deadline.label('old_deadline'), tasks.c.deadline)
+                    )
+                    rows = (await session.execute(query)).all()
+                    deadlines += [deadline for row in rows for deadline in (row.old_deadline, row.deadline)]
+                    changed_ids += [row.id for row in rows]
+                    updated = {row.id for row in rows}
+                    results += [(task_id, 'update', 'updated' if task_id in updated else 'not_found') for task_id in ids]
+                if delete_ids:
+                    query = (
+                        delete(tasks)
+                        .where(tasks.c.id == any_(bindparam('ids', delete_ids, type_=ARRAY(Integer))))
+                        .returning(tasks.c.id, tasks.c.deadline)
+                    )
+                    rows = (await session.execute(query)).all()
+                    deadlines += [row.deadline for row in rows]
+                    changed_ids += [row.id for row in rows]
+                    deleted = {row.id for row in rows}
+                    results += [(task_id, 'delete', 'deleted' if task_id in deleted else 'not_found')
+                                for task_id in delete_ids]
+                await self._notify(session, changed_ids, deadlines)
+        except IntegrityError as e:
+            raise TaskAlreadyExistsError(reason=f'Batch update violates unique (name, deadline): {e.orig}')
+        self.mark_changed(*deadlines, ids=changed_ids)
+        return results
+
+    @measure_time
+    async def count_tasks_by_period(self,
+                                    from_date: datetime.datetime,
+                                    to_date: datetime.datetime,
+                                    period: str = 'day') -> dict[datetime.date, dict[str, int]]:
+        """Counts tasks per deadline day or month in [from_date, to_date) with one GROUP BY query.
+        The counts fill the calendar caches, so months written within the read-your-writes window are read
+        from the primary: a lagging replica would cache the old counts under the new version."""
+        bucket = func.date(func.date_trunc(period, Task.deadline))
+        query = (
+            select(bucket.label('bucket'),
+                   func.count().label('total'),
+                   func.count().filter(Task.done.is_(True)).label('done'))
+            .where(Task.deadline >= from_date, Task.deadline < to_date)
+            .group_by(bucket)
+        )
+        rows = await self._read(query, lambda result: result.all(), primary=self._changed_recently(from_date, to_date))
+        return {row.bucket: {'total': row.total, 'done': row.done, 'open': row.total - row.done} for row in rows}
 
+    @measure_time
     async def update_task(self,
                           name: str,
                           deadline: datetime.datetime,
                           new_deadline: datetime.datetime | None = None,
                           comment: str | None = None,
                           done: bool | None = None):
-        async with self.session.begin():
-            result = await self.session.execute(select(Task).where(Task.name == name, Task.deadline == deadline))
-            task = result.scalar_one_or_none()
-            if task:
-                task.deadline = new_deadline if new_deadline else task.deadline
-                task.done = eval(done) if done is not None else task.done
-                task.comment = comment if comment else task.comment
-                await self.session.commit()
-                logger.info(f'Task {name} updated successfully.')
-                return task
-            else:
-                logger.error(f'Task {name} for update not found')
-                raise TaskNotFoundError(reason="Task not found")
+        try:
+            async with self.session_maker() as session, session.begin():
+                result = await session.execute(select(Task).where(Task.name == name, Task.deadline == deadline))
+                task = result.scalar_one_or_none()
+                if task:
+                    task.deadline = new_deadline if new_deadline else task.deadline
+                    task.done = eval(done) if done is not None else task.done
+                    task.comment = comment if comment else task.comment
+                    await session.flush()
+                    await self._notify(session, [task.id], [deadline, new_deadline])
+                    logger.info(f'Task {name} updated successfully.')
+                else:
+                    logger.error(f'Task {name} for update not found')
+                    raise TaskNotFoundError(reason="Task not found")
+        except IntegrityError:
+            raise TaskAlreadyExistsError(reason=f'Task {name} {new_deadline} already exists')
+        self.mark_changed(deadline, new_deadline, ids=[task.id])
+        return task
 
+    @measure_time
     async def delete_task(self, name: str, deadline: datetime.datetime):
-        async with self.session.begin():
-            result = await self.session.execute(select(Task).where(Task.name == name, Task.deadline == deadline))
+        async with self.session_maker() as session, session.begin():
+            result = await session.execute(select(Task).where(Task.name == name, Task.deadline == deadline))
             task = result.scalars().first()
 
             if task:
-                await self.session.delete(task)
-                await self.session.commit()
+                await session.delete(task)
+                await self._notify(session, [task.id], [deadline])
                 logger.info(f"Задача {name} удалена.")
             else:
                 logger.error(f'Task {name} for update not found')
                 raise TaskNotFoundError(reason="Task not found")
+        self.mark_changed(deadline, ids=[task.id])
 
-    async def delete_done_tasks(self):
-        async with self.session.begin():
+    @measure_time
+    async def delete_done_tasks(self,
+                                older_than: datetime.datetime | None = None,
+                                batch_size: int | None = None) -> int:
+        """Deletes done tasks with set-based DELETE ... RETURNING statements, batch_size rows per transaction."""
+        batch_size = batch_size or self.config.purge.batch_size
+        deleted = 0
+        while True:
+            ids = select(Task.id).where(Task.done.is_(True))
+            if older_than:
+                ids = ids.where(Task.deadline < older_than)
+            query = (
+                delete(Task)
+                .where(Task.id.in_(ids.limit(batch_size).scalar_subquery()))
+                .returning(Task.id, Task.deadline)
+                .execution_options(synchronize_session=False)
+            )
             try:
-                done_tasks = await self.session.execute(select(Task).where(Task.done == True))
-                tasks_to_delete = done_tasks.scalars().all()
-                for task in tasks_to_delete:
-                    await self.session.delete(task)
-                await self.session.commit()
-                logger.info(f"Все выполненные задачи удалены")
+                async with self.session_maker() as session, session.begin():
+                    rows = (await session.execute(query)).all()
+                    await self._notify(session, [row.id for row in rows], [row.deadline for row in rows])
             except Exception as e:
                 logger.error(f'Failed to delete tasks: {e.__class__.__name__}, {e}')
                 raise e
+            self.mark_changed(*(row.deadline for row in rows), ids=(row.id for row in rows))
+            deleted += len(rows)
+            if len(rows) < batch_size:
+                break
+        logger.info(f"Удалено выполненных задач: {deleted}")
+        return deleted
+
+    @measure_time
+    async def archive_done_tasks(self, older_than: datetime.datetime, batch_size: int | None = None) -> int:
+        """Moves done tasks to tasks_archive with one DELETE ... RETURNING feeding an INSERT,
+        batch_size rows per transaction."""
+        batch_size = batch_size or self.config.archive.batch_size
+        archived = 0
+        while True:
+            try:
+                async with self.session_maker() as session, session.begin():
+                    rows = (await session.execute(ARCHIVE_DONE_TASKS, {"older_than": older_than,
+                                                                       "batch_size": batch_size})).all()
+                    await self._notify(session, [row.id for row in rows], [row.deadline for row in rows])
+            except Exception as e:
+                logger.error(f'Failed to archive tasks: {e.__class__.__name__}, {e}')
+                raise e
+            self.mark_changed(*(row.deadline for row in rows), ids=(row.id for row in rows))
+            archived += len(rows)
+            if len(rows) < batch_size:
+                break
+        return archived
+
+    def pool_status(self) -> dict[str, int]:
+        """Returns the connection pool usage, all zeros before the engine is created."""
+        if self.engine is None:
+            return {"size": 0, "checked_out": 0, "checked_in": 0, "overflow": 0}
+        pool = self.engine.pool
+        return {"size": pool.size(), "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(), "overflow": max(pool.overflow(), 0)}
 
     async def close(self):
-        if self.session:
-            await self.session.close()
+        if self.listener:
+            await self.listener.close()
+        connections, self.lock_connections = list(self.lock_connections.values()), {}
+        for conn in connections:
+            await conn.close()
+        for query_logger in self.query_loggers:
+            await query_logger.close()
+        if self.reads:
+            await self.reads.close()
+        if self.engine:
+            await self.engine.dispose()
 
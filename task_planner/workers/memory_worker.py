@@ -0,0 +1,368 @@
+import asyncio
+import bisect
+import datetime
+import heapq
+import itertools
+import re
+from typing import Iterable, Iterator
+
+from loguru import logger
+
+from task_planner.application.models import Task
+from task_planner.application.benchmarking import measure_time
+from task_planner.configs.config import Config
+from task_planner.application.exceptions import TaskNotFoundError, TaskAlreadyExistsError
+from task_planner.workers.storage import Storage
+
+
+class MemoryWorker(Storage):
+    """In-process storage: tasks by id, a (deadline, id) list kept sorted with bisect for range scans and
+    ordered pages, and hash indexes by lower-cased name and by the unique (name, deadline) pair.
+
+    Archived tasks are kept apart, in a (deadline, id) list of their own.
+
+    Every method runs without awaiting in between its reads and writes, so each call is atomic on the event loop.
+    Data lives only as long as the process.
+    """
+
+    def __init__(self, config: Config):
+        super().__init__(config)
+        self.next_id = 1
+        self.tasks: dict[int, Task] = {}
+        self.by_deadline: list[tuple[datetime.datetime, int]] = []
+        self.by_name: dict[str, set[int]] = {}
+        self.by_key: dict[tuple[str, datetime.datetime], int] = {}
+        self.archived: dict[int, Task] = {}
+        self.archived_by_deadline: list[tuple[datetime.datetime, int]] = []
+
+    async def init(self):
+        logger.info('----- Memory worker initialized -----')
+
+    def _insert(self, name: str, deadline: datetime.datetime, comment: str, done: bool) -> Task:
+        task = Task(id=self.next_id, name=name, deadline=deadline, comment=comment, done=done)
+        self.next_id += 1
+        self.tasks[task.id] = task
+        self._index(task)
+        return task
+
+    def _index(self, task: Task):
+        bisect.insort(self.by_deadline, (task.deadline, task.id))
+        self.by_name.setdefault(task.name.lower(), set()).add(task.id)
+        self.by_key[(task.name, task.deadline)] = task.id
+
+    def _unindex(self, task: Task):
+        del self.by_deadline[bisect.bisect_left(self.by_deadline, (task.deadline, task.id))]
+        ids = self.by_name[task.name.lower()]
+        ids.discard(task.id)
+        if not ids:
+            del self.by_name[task.name.lower()]
+        del self.by_key[(task.name, task.deadline)]
+
+    def _remove(self, task: Task):
+        self._unindex(task)
+        del self.tasks[task.id]
+
+    def _scan(self,
+              from_date: datetime.datetime | None = None,
+              to_date: datetime.datetime | None = None,
+              to_inclusive: bool = True,
+              after: tuple[datetime.datetime, int] | None = None) -> Iterator[Task]:
+        """Yields tasks in (deadline, id) order between the bounds using the sorted deadline index.
+        The index must not change while the generator is consumed."""
+        start = 0
+        if from_date:
+            start = bisect.bisect_left(self.by_deadline, (from_date,))
+        if after:
+            start = max(start, bisect.bisect_right(self.by_deadline, after))
+        end = len(self.by_deadline)
+        if to_date:
+            end = bisect.bisect_right(self.by_deadline, (to_date, float('inf')) if to_inclusive else (to_date,))
+        for index in range(start, end):
+            yield self.tasks[self.by_deadline[index][1]]
+
+    def _select(self,
+                name: str | None = None,
+                task_id: int | None = None,
+                task_ids: list[int] | None = None,
+                from_date: datetime.datetime | None = None,
+                to_date: datetime.datetime | None = None,
+                comment: str | None = None,
+                done: bool | None = None,
+                after: tuple[datetime.datetime, int] | None = None) -> Iterator[Task]:
+        if task_id:
+            candidates: Iterable[Task] = [self.tasks[task_id]] if task_id in self.tasks else []
+        elif task_ids is not None:
+            candidates = sorted((self.tasks[i] for i in set(task_ids) if i in self.tasks),
+                                key=lambda task: (task.deadline, task.id))
+        elif name:
+            ids = self.by_name.get(name.lower(), ())
+            candidates = sorted((self.tasks[i] for i in ids), key=lambda task: (task.deadline, task.id))
+        else:
+            candidates = self._scan(from_date, to_date, after=after)
+        for task in candidates:
+            if ((done is None or task.done == done)
+                    and (not comment or task.comment == comment)
+                    and (not from_date or task.deadline >= from_date)
+                    and (not to_date or task.deadline <= to_date)
+                    and (not after or (task.deadline, task.id) > after)):
+                yield task
+
+    def _select_archived(self,
+                         name: str | None = None,
+                         task_id: int | None = None,
+                         task_ids: list[int] | None = None,
+                         from_date: datetime.datetime | None = None,
+                         to_date: datetime.datetime | None = None,
+                         comment: str | None = None,
+                         done: bool | None = None,
+                         after: tuple[datetime.datetime, int] | None = None) -> Iterator[Task]:
+        """Yields archived tasks in (deadline, id) order; only the deadline bounds use the index."""
+        start = bisect.bisect_left(self.archived_by_deadline, (from_date,)) if from_date else 0
+        if after:
+            start = max(start, bisect.bisect_right(self.archived_by_deadline, after))
+        end = len(self.archived_by_deadline)
+        if to_date:
+            end = bisect.bisect_right(self.archived_by_deadline, (to_date, float('inf')))
+        task_ids = set(task_ids) if task_ids is not None else None
+        for index in range(start, end):
+            task = self.archived[self.archived_by_deadline[index][1]]
+            if ((not task_id or task.id == task_id)
+                    and (task_ids is None or task.id in task_ids)
+                    and (not name or task.name.lower() == name.lower())
+                    and (done is None or task.done == done)
+                    and (not comment or task.comment == comment)):
+                yield task
+
+    @measure_time
+    async def get_tasks(self,
+                        name: str | None = None,
+                        task_id: int | None = None,
+                        task_ids: list[int] | None = None,
+                        from_date: datetime.datetime | None = None,
+                        to_date: datetime.datetime | None = None,
+                        comment: str | None = None,
+                        done: bool | None = None,
+                        for_calendar: bool = False,
+                        limit: int | None = None,
+                        after: tuple[datetime.datetime, int] | None = None,
+                        include_archived: bool = False) -> list[Task]:
+        filters = dict(name=name, task_id=task_id, task_ids=task_ids, from_date=from_date,
+                       to_date=to_date, comment=comment, done=done, after=after)
+        selected = self._select(**filters)
+        if include_archived:
+            selected = heapq.merge(selected, self._select_archived(**filters),
+                                   key=lambda task: (task.deadline, task.id))
+        tasks = []
+        for task in selected:
+            tasks.append(task)
+            if limit and len(tasks) >= limit:
+                break
+        if not tasks and not for_calendar:
+            raise TaskNotFoundError(reason=f'Task {task_id} not found')
+        return tasks
+
+    @measure_time
+    async def get_task_rows(self,
+                            limit: int,
+                            after: tuple[datetime.datetime, int] | None = None,
+                            **filters) -> list[tuple]:
+        tasks = itertools.islice(self._select(after=after, **filters), limit)
+        return [(task.id, task.name, task.deadline, task.comment, task.done) for task in tasks]
+
+    async def stream_tasks(self, chunk_size: int = 1000, **filters):
+        rows = [(task.id, task.name, task.deadline, task.comment, task.done) for task in self._select(**filters)]
+        for start in range(0, len(rows), chunk_size):
+            yield rows[start:start + chunk_size]
+
+    @measure_time
+    async def search_tasks(self, search_text: str, limit: int, **filters) -> list[Task]:
+        """Ranks tasks by the number of name and comment words starting with every searched word."""
+        words = [word.lower() for word in re.findall(r'\w+', search_text)]
+        if not words:
+            raise TaskNotFoundError(reason=f'Nothing to search in {search_text!r}')
+        ranked = []
+        for task in self._select(**filters):
+            task_words = re.findall(r'\w+', f'{task.name} {task.comment or ""}'.lower())
+            matches = [sum(task_word.startswith(word) for task_word in task_words) for word in words]
+            if all(matches):
+                ranked.append((-sum(matches), task.deadline, task.id, task))
+        ranked.sort(key=lambda item: item[:3])
+        if not ranked:
+            raise TaskNotFoundError(reason=f'Tasks for {search_text!r} not found')
+        return [item[3] for item in ranked[:limit]]
+
+    @measure_time
+    async def count_tasks(self,
+                          name: str | None = None,
+                          from_date: datetime.datetime | None = None,
+                          to_date: datetime.datetime | None = None,
+                          done: bool | None = None) -> dict[str, int]:
+        today = datetime.datetime.combine(datetime.date.today(), datetime.time.min)
+        tomorrow = today + datetime.timedelta(days=1)
+        week_end = today + datetime.timedelta(days=7)
+        counts = dict.fromkeys(('total', 'done', 'open', 'overdue', 'today', 'week', 'later'), 0)
+        for task in self._select(name=name, from_date=from_date, to_date=to_date, done=done):
+            counts['total'] += 1
+            if task.done:
+                counts['done'] += 1
+                continue
+            counts['open'] += 1
+            if task.deadline < today:
+                counts['overdue'] += 1
+            elif task.deadline < tomorrow:
+                counts['today'] += 1
+            elif task.deadline < week_end:
+                counts['week'] += 1
+            else:
+                counts['later'] += 1
+        return counts
+
+    @measure_time
+    async def add_task(self, name: str, deadline: datetime.datetime, comment: str) -> int:
+        existing_id = self.by_key.get((name, deadline))
+        if existing_id is not None:
+            raise TaskAlreadyExistsError(reason=f'Task {name} {deadline} already exists', task_id=existing_id)
+        task = self._insert(name, deadline, comment, False)
+        self.mark_changed(deadline, ids=[task.id])
+        return task.id
+
+    @measure_time
+    async def import_tasks(self, records: list[tuple]) -> dict[int, bool]:
+        results, inserted = {}, []
+        for row_num, name, deadline, comment, done in records:
+            results[row_num] = (name, deadline) not in self.by_key
+            if results[row_num]:
+                inserted.append(self._insert(name, deadline, comment, done))
+        self.mark_changed(*(task.deadline for task in inserted), ids=(task.id for task in inserted))
+        return results
+
+    @measure_time
+    async def batch_tasks(self,
+                          updates: list[dict] | None = None,
+                          delete_ids: list[int] | None = None) -> list[tuple[int, str, str]]:
+        """Plans every change first and checks the final (name, deadline) pairs, so a conflicting
+        batch leaves the storage untouched."""
+        planned: dict[int, dict] = {}
+        results = []
+        for changes in updates or []:
+            values = {key: value for key, value in changes.items() if key != 'ids'}
+            for task_id in changes['ids']:
+                if task_id in self.tasks:
+                    planned.setdefault(task_id, {}).update(values)
+                results.append((task_id, 'update', 'updated' if task_id in self.tasks else 'not_found'))
+        deleted = {task_id for task_id in delete_ids or [] if task_id in self.tasks}
+        results += [(task_id, 'delete', 'deleted' if task_id in deleted else 'not_found') for task_id in delete_ids or []]
+
+        final_keys = {}
+        for task_id, values in planned.items():
+            if task_id in deleted:
+                continue
+            task = self.tasks[task_id]
+            key = (task.name, values.get('deadline', task.deadline))
+            owner = self.by_key.get(key, task_id)
+            untouched_owner = owner != task_id and owner not in planned and owner not in deleted
+            if untouched_owner or final_keys.setdefault(key, task_id) != task_id:
+                raise TaskAlreadyExistsError(reason=f'Batch update violates unique (name, deadline): {key}')
+
+        deadlines = []
+        for task_id, values in planned.items():
+            task = self.tasks[task_id]
+            self._unindex(task)
+            deadlines += [task.deadline, values.get('deadline')]
+            for key, value in values.items():
+                setattr(task, key, value)
+        for task_id in planned:
+            self._index(self.tasks[task_id])
+        for task_id in deleted:
+            deadlines.append(self.tasks[task_id].deadline)
+            self._remove(self.tasks[task_id])
+        self.mark_changed(*deadlines, ids=[*planned, *deleted])
+        return results
+
+    @measure_time
+    async def count_tasks_by_period(self,
+                                    from_date: datetime.datetime,
+                                    to_date: datetime.datetime,
+                                    period: str = 'day') -> dict[datetime.date, dict[str, int]]:
+        counts = {}
+        for task in self._scan(from_date, to_date, to_inclusive=False):
+            bucket = task.deadline.date() if period == 'day' else task.deadline.date().replace(day=1)
+            bucket_counts = counts.setdefault(bucket, {'total': 0, 'done': 0, 'open': 0})
+            bucket_counts['total'] += 1
+            bucket_counts['done' if task.done else 'open'] += 1
+        return counts
+
+    @measure_time
+    async def update_task(self,
+                          name: str,
+                          deadline: datetime.datetime,
+                          new_deadline: datetime.datetime | None = None,
+                          comment: str | None = None,
+                          done: bool | None = None) -> Task:
+        task_id = self.by_key.get((name, deadline))
+        if task_id is None:
+            logger.error(f'Task {name} for update not found')
+            raise TaskNotFoundError(reason="Task not found")
+        if new_deadline and self.by_key.get((name, new_deadline), task_id) != task_id:
+            raise TaskAlreadyExistsError(reason=f'Task {name} {new_deadline} already exists')
+        task = self.tasks[task_id]
+        self._unindex(task)
+        task.deadline = new_deadline if new_deadline else task.deadline
+        task.done = done in ('True', True) if done is not None else task.done
+        task.comment = comment if comment else task.comment
+        self._index(task)
+        logger.info(f'Task {name} updated successfully.')
+        self.mark_changed(deadline, new_deadline, ids=[task_id])
+        return task
+
+    @measure_time
+    async def delete_task(self, name: str, deadline: datetime.datetime):
+        task_id = self.by_key.get((name, deadline))
+        if task_id is None:
+            logger.error(f'Task {name} for update not found')
+            raise TaskNotFoundError(reason="Task not found")
+        self._remove(self.tasks[task_id])
+        logger.info(f"Задача {name} удалена.")
+        self.mark_changed(deadline, ids=[task_id])
+
+    @measure_time
+    async def delete_done_tasks(self,
+                                older_than: datetime.datetime | None = None,
+                                batch_size: int | None = None) -> int:
+        """Deletes done tasks batch_size at a time, yielding to the event loop between batches."""
+        batch_size = batch_size or self.config.purge.batch_size
+        deleted = 0
+        while True:
+            done_tasks = (task for task in self._scan(to_date=older_than, to_inclusive=False) if task.done)
+            batch = list(itertools.islice(done_tasks, batch_size))
+            for task in batch:
+                self._remove(task)
+            self.mark_changed(*(task.deadline for task in batch), ids=(task.id for task in batch))
+            deleted += len(batch)
+            if len(batch) < batch_size:
+                break
+            await asyncio.sleep(0)
+        logger.info(f"Удалено выполненных задач: {deleted}")
+        return deleted
+
+    @measure_time
+    async def archive_done_tasks(self, older_than: datetime.datetime, batch_size: int | None = None) -> int:
+        """Moves done tasks to the archive batch_size at a time, yielding to the event loop between batches."""
+        batch_size = batch_size or self.config.archive.batch_size
+        archived = 0
+        while True:
+            done_tasks = (task for task in self._scan(to_date=older_than, to_inclusive=False) if task.done)
+            batch = list(itertools.islice(done_tasks, batch_size))
+            for task in batch:
+                self._remove(task)
+                self.archived[task.id] = task
+                bisect.insort(self.archived_by_deadline, (task.deadline, task.id))
+            self.mark_changed(*(task.deadline for task in batch), ids=(task.id for task in batch))
+            archived += len(batch)
+            if len(batch) < batch_size:
+                break
+            await asyncio.sleep(0)
+        return archived
+
+    async def close(self):
+        pass
@@ -0,0 +1,320 @@
+import datetime
+import time
+from dataclasses import dataclass
+
+import asyncpg
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from task_planner.application.exceptions import MigrationError
+from task_planner.application.models import SEARCH_VECTOR_EXPRESSION
+from task_planner.configs.config import Config
+
+SCHEMA_VERSION_TABLE = 'schema_version'
+MIGRATIONS_LOCK_ID = 7_413_220_001
+CREATE_SCHEMA_VERSION = text(f"""
+    CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (
+        version integer PRIMARY KEY,
+        description text NOT NULL,
+        applied_at timestamptz NOT NULL DEFAULT now()
+    )
+""")
+SELECT_SCHEMA_VERSION = text(f"SELECT coalesce(max(version), 0) FROM {SCHEMA_VERSION_TABLE}")
+INSERT_SCHEMA_VERSION = text(f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description) VALUES (:version, :description)")
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    statements: tuple[str, ...]
+    optional_statements: tuple[str, ...] = ()
+    # A query listing rows the statements cannot be applied to, and the statements moving them aside.
+    conflicts: str | None = None
+    resolve_conflicts: tuple[str, ...] = ()
+
+
+# Statements are idempotent, so databases created by the old create_all on boot are adopted as is.
+MIGRATIONS = (
+    Migration(1, 'tasks table', (
+        """CREATE TABLE IF NOT EXISTS tasks_data (
+            id serial PRIMARY KEY,
+            name varchar,
+            deadline timestamp,
+            comment text,
+            done boolean
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_data_id ON tasks_data (id)",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_data_name ON tasks_data (name)",
+    )),
+    Migration(2, 'keyset, unique (name, deadline) and case-insensitive name indexes', (
+        "CREATE INDEX IF NOT EXISTS ix_tasks_data_deadline_id ON tasks_data (deadline, id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_tasks_data_name_deadline ON tasks_data (name, deadline)",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_data_name_lower ON tasks_data (lower(name))",
+    ),
+        # Older versions checked for duplicates before inserting without a lock.
+        conflicts="""SELECT name, deadline, count(*) FROM tasks_data
+            GROUP BY name, deadline HAVING count(*) > 1 ORDER BY name, deadline""",
+        # The first task of each (name, deadline) stays, the others are kept in tasks_data_duplicates.
+        resolve_conflicts=(
+            """CREATE TABLE IF NOT EXISTS tasks_data_duplicates (
+                id integer PRIMARY KEY,
+                name varchar,
+                deadline timestamp,
+                comment text,
+                done boolean,
+                moved_at timestamp DEFAULT now()
+            )""",
+            """WITH moved AS (
+                DELETE FROM tasks_data t USING tasks_data d
+                WHERE t.name = d.name AND t.deadline = d.deadline AND t.id > d.id
+                RETURNING t.id, t.name, t.deadline, t.comment, t.done
+            )
+            INSERT INTO tasks_data_duplicates (id, name, deadline, comment, done)
+            SELECT id, name, deadline, comment, done FROM moved""",
+        )),
+    Migration(3, 'full-text search vector and trigram name index', (
+        f"ALTER TABLE tasks_data ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({SEARCH_VECTOR_EXPRESSION}) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_data_search_vector ON tasks_data USING gin (search_vector)",
+    ), optional_statements=(
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_data_name_trgm ON tasks_data USING gin (name gin_trgm_ops)",
+    )),
+    Migration(4, 'archive table for old done tasks', (
+        """CREATE TABLE IF NOT EXISTS tasks_archive (
+            id integer PRIMARY KEY,
+            name varchar,
+            deadline timestamp,
+            comment text,
+            done boolean,
+            archived_at timestamp DEFAULT now()
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_archive_deadline_id ON tasks_archive (deadline, id)",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_archive_name_lower ON tasks_archive (lower(name))",
+    )),
+)
+LATEST_VERSION = MIGRATIONS[-1].version
+
+PARTITIONS_LOCK_ID = 7_413_220_003
+DEFAULT_PARTITION = 'tasks_data_default'
+IS_PARTITIONED = text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('tasks_data')")
+CREATE_PARTITIONED_TASKS = f"""
+    CREATE TABLE tasks_data (
+        id integer NOT NULL DEFAULT nextval('tasks_data_id_seq'),
+        name varchar,
+        deadline timestamp NOT NULL,
+        comment text,
+        done boolean,
+        search_vector tsvector GENERATED ALWAYS AS ({SEARCH_VECTOR_EXPRESSION}) STORED,
+        PRIMARY KEY (id, deadline)
+    ) PARTITION BY RANGE (deadline)
+"""
+
+
+def database_url(config: Config, host: str | None = None, port: int | None = None) -> str:
+    return (f"postgresql+asyncpg://{config.db.user}:{config.db.password}"
+            f"@{host or config.db.host}:{port or config.db.port}/{config.db.db_name}")
+
+
+async def connect(config: Config) -> asyncpg.Connection:
+    """Opens a connection outside the SQLAlchemy pool, for LISTEN and session-level locks."""
+    return await asyncpg.connect(user=config.db.user,
+                                 password=config.db.password,
+                                 host=config.db.host,
+                                 port=config.db.port,
+                                 database=config.db.db_name)
+
+
+async def create_database(config: Config):
+    conn = await asyncpg.connect(user=config.db.user,
+                                 password=config.db.password,
+                                 host=config.db.host,
+                                 port=config.db.port)
+    try:
+        await conn.execute(f"CREATE DATABASE {config.db.db_name}")
+        logger.info(f'DB {config.db.db_name} created')
+    except asyncpg.exceptions.DuplicateDatabaseError:
+        logger.info(f'DB {config.db.db_name} already exists')
+    finally:
+        await conn.close()
+
+
+async def schema_version(conn: AsyncConnection) -> int:
+    """Returns the applied schema version, 0 for a database that was never migrated."""
+    exists = (await conn.execute(text("SELECT to_regclass(:table)"), {"table": SCHEMA_VERSION_TABLE})).scalar()
+    if exists is None:
+        return 0
+    return (await conn.execute(SELECT_SCHEMA_VERSION)).scalar_one()
+
+
+async def apply_migration(conn: AsyncConnection, migration: Migration, resolve_conflicts: bool = False):
+    if migration.conflicts is not None:
+        await check_conflicts(conn, migration, resolve_conflicts)
+    await apply_statements(conn, migration)
+    await conn.execute(INSERT_SCHEMA_VERSION, {"version": migration.version, "description": migration.description})
+
+
+async def check_conflicts(conn: AsyncConnection, migration: Migration, resolve: bool):
+    """Raises MigrationError listing the rows that block the migration, unless resolve is set:
+    then they are moved aside by the resolve_conflicts statements and nothing is deleted."""
+    conflicts = (await conn.execute(text(migration.conflicts))).all()
+    if not conflicts:
+        return
+    if not resolve:
+        listed = '; '.join(', '.join(str(value) for value in row) for row in conflicts[:20])
+        more = f' and {len(conflicts) - 20} more' if len(conflicts) > 20 else ''
+        raise MigrationError(reason=f'Migration {migration.version} ({migration.description}) is blocked by '
+                                    f'{len(conflicts)} conflicting groups: {listed}{more}. Resolve them or run '
+                                    f'with --move-conflicts')
+    moved = 0
+    for statement in migration.resolve_conflicts:
+        moved += max((await conn.execute(text(statement))).rowcount, 0)
+    logger.warning(f'Migration {migration.version} ({migration.description}) moved {moved} conflicting rows '
+                   f'of {len(conflicts)} groups aside')
+
+
+async def apply_statements(conn: AsyncConnection, migration: Migration):
+    for statement in migration.statements:
+        await conn.execute(text(statement))
+    if migration.optional_statements:
+        try:
+            async with conn.begin_nested():
+                for statement in migration.optional_statements:
+                    await conn.execute(text(statement))
+        except DBAPIError as e:
+            logger.warning(f'Optional part of migration {migration.version} ({migration.description}) '
+                           f'skipped: {e.orig}')
+
+
+def month_start(date: datetime.date, months: int = 0) -> datetime.date:
+    """First day of the month `months` away from the month of date."""
+    index = date.year * 12 + date.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f'tasks_data_p{month.year:04d}_{month.month:02d}'
+
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    return bool((await conn.execute(IS_PARTITIONED)).scalar())
+
+
+async def create_month_partition(conn: AsyncConnection, month: datetime.date) -> bool:
+    """Creates the partition of the deadline month unless it exists. Rows of the month that landed in the
+    default partition meanwhile are moved into it before it is attached. Returns whether it was created."""
+    name = partition_name(month)
+    if (await conn.execute(text("SELECT to_regclass(:name)"), {"name": name})).scalar() is not None:
+        return False
+    start, end = month, month_start(month, 1)
+    await conn.execute(text(f"CREATE TABLE {name} (LIKE tasks_data INCLUDING DEFAULTS INCLUDING GENERATED)"))
+    await conn.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION} WHERE deadline >= :start AND deadline < :end
+            RETURNING id, name, deadline, comment, done
+        )
+        INSERT INTO {name} (id, name, deadline, comment, done) SELECT id, name, deadline, comment, done FROM moved
+    """), {"start": start, "end": end})
+    await conn.execute(text(f"ALTER TABLE tasks_data ATTACH PARTITION {name} "
+                            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"))
+    return True
+
+
+async def create_month_partitions(conn: AsyncConnection, first: datetime.date, last: datetime.date) -> int:
+    """Creates the missing month partitions from the month of first to the month of last, under a lock
+    held until the end of the transaction. Returns how many were created."""
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": PARTITIONS_LOCK_ID})
+    created, month = 0, month_start(first)
+    while month <= last:
+        created += await create_month_partition(conn, month)
+        month = month_start(month, 1)
+    return created
+
+
+async def partition_tasks(config: Config) -> bool:
+    """Rebuilds tasks_data as a table range-partitioned by deadline month, in one transaction.
+
+    Months from months_behind before now (or the earliest deadline, if later) to months_ahead after now
+    get their own partitions, other deadlines go to the default partition; the scheduler keeps creating
+    partitions ahead. The primary key becomes (id, deadline), as Postgres requires the partition key in
+    unique constraints; ids still come from the same sequence. Returns False if it was partitioned already.
+    """
+    engine = create_async_engine(database_url(config))
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": MIGRATIONS_LOCK_ID})
+            version = await schema_version(conn)
+            if version != LATEST_VERSION:
+                raise MigrationError(reason=f'Schema version is {version}, migrate to {LATEST_VERSION} first')
+            if await is_partitioned(conn):
+                logger.info('tasks_data is partitioned already')
+                return False
+            start_time = time.perf_counter()
+            bounds = (await conn.execute(text(
+                "SELECT min(deadline), count(*) FILTER (WHERE deadline IS NULL) FROM tasks_data"
+            ))).one()
+            if bounds[1]:
+                raise MigrationError(reason=f'{bounds[1]} tasks have no deadline, they cannot be partitioned')
+            today = datetime.date.today()
+            first = month_start(today, -config.partitioning.months_behind)
+            if bounds[0] is not None:
+                first = max(first, month_start(bounds[0]))
+            for statement in (
+                "ALTER TABLE tasks_data RENAME TO tasks_data_unpartitioned",
+                "ALTER TABLE tasks_data_unpartitioned "
+                "RENAME CONSTRAINT tasks_data_pkey TO tasks_data_unpartitioned_pkey",
+                "ALTER SEQUENCE tasks_data_id_seq OWNED BY NONE",
+                CREATE_PARTITIONED_TASKS,
+                f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF tasks_data DEFAULT",
+            ):
+                await conn.execute(text(statement))
+            last = month_start(today, config.partitioning.months_ahead)
+            partitions = await create_month_partitions(conn, first, last)
+            await conn.execute(text("""
+                INSERT INTO tasks_data (id, name, deadline, comment, done)
+                SELECT id, name, deadline, comment, done FROM tasks_data_unpartitioned
+            """))
+            await conn.execute(text("DROP TABLE tasks_data_unpartitioned"))
+            await conn.execute(text("ALTER SEQUENCE tasks_data_id_seq OWNED BY tasks_data.id"))
+            index_migration = Migration(LATEST_VERSION, 'tasks_data indexes on partitions', tuple(
+                statement for migration in MIGRATIONS for statement in migration.statements
+                if statement.startswith(('CREATE INDEX', 'CREATE UNIQUE INDEX')) and ' ON tasks_data ' in statement
+            ), tuple(statement for statement in MIGRATIONS[2].optional_statements))
+            await apply_statements(conn, index_migration)
+    finally:
+        await engine.dispose()
+    logger.info(f'tasks_data partitioned by deadline month into {partitions} partitions and the default one '
+                f'in {time.perf_counter() - start_time:0.3f} seconds')
+    return True
+
+
+async def migrate(config: Config, create_db: bool = True, resolve_conflicts: bool = False) -> int:
+    """Applies pending migrations, each in its own transaction under an advisory lock, so concurrent
+    runs wait for each other instead of applying a migration twice. A migration blocked by conflicting
+    rows fails with MigrationError, unless resolve_conflicts moves them aside. Returns the resulting version."""
+    if create_db:
+        await create_database(config)
+    engine = create_async_engine(database_url(config))
+    lock = text("SELECT pg_advisory_xact_lock(:lock_id)").bindparams(lock_id=MIGRATIONS_LOCK_ID)
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(lock)
+            await conn.execute(CREATE_SCHEMA_VERSION)
+        for migration in MIGRATIONS:
+            async with engine.begin() as conn:
+                await conn.execute(lock)
+                if await schema_version(conn) >= migration.version:
+                    continue
+                start_time = time.perf_counter()
+                await apply_migration(conn, migration, resolve_conflicts)
+            logger.info(f'Migration {migration.version} ({migration.description}) applied '
+                        f'in {time.perf_counter() - start_time:0.3f} seconds')
+        async with engine.connect() as conn:
+            version = await schema_version(conn)
+    finally:
+        await engine.dispose()
+    logger.info(f'DB {config.db.db_name} schema is at version {version}')
+    return version
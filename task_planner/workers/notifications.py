@@ -0,0 +1,68 @@
+import asyncio
+
+import asyncpg
+import orjson
+from loguru import logger
+
+from task_planner.configs.config import Config
+from task_planner.workers.migrations import connect
+
+
+class ChangeListener:
+    """Receives the change events other workers send with NOTIFY and applies them to the storage.
+
+    LISTEN runs on a dedicated asyncpg connection outside the pool. When the connection is lost it is
+    reopened every reconnect_delay seconds; events sent meanwhile are lost, so the storage is resynced.
+    """
+
+    def __init__(self, config: Config, storage):
+        self.config = config
+        self.storage = storage
+        self.connection: asyncpg.Connection | None = None
+        self._lost = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        await self._listen()
+        self._task = asyncio.get_running_loop().create_task(self._watch())
+        logger.info(f'Listening for task changes on channel {self.config.notifications.channel}')
+
+    async def _listen(self):
+        self.connection = await connect(self.config)
+        self._lost.clear()
+        self.connection.add_termination_listener(lambda connection: self._lost.set())
+        await self.connection.add_listener(self.config.notifications.channel, self.on_notification)
+
+    async def _watch(self):
+        while True:
+            await self._lost.wait()
+            logger.warning('Connection for task change notifications is lost, reconnecting')
+            while True:
+                await asyncio.sleep(self.config.notifications.reconnect_delay)
+                try:
+                    await self._listen()
+                    break
+                except (OSError, asyncpg.PostgresError) as e:
+                    logger.warning(f'Failed to reconnect for task change notifications: {e.__class__.__name__}, {e}')
+            self.storage.resync()
+            logger.info('Listening for task changes again, caches are dropped')
+
+    def on_notification(self, connection, pid: int, channel: str, payload: str):
+        try:
+            event = orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            event = None
+        if not isinstance(event, dict):
+            logger.warning(f'Malformed task change notification: {payload[:200]}')
+            return
+        self.storage.apply_change(event)
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.connection and not self.connection.is_closed():
+            await self.connection.close()
@@ -0,0 +1,81 @@
+import asyncio
+import random
+import re
+import time
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from task_planner.application.metrics import SLOW_QUERIES
+from task_planner.configs.config import SlowQueryLog
+
+MAX_STATEMENT_LENGTH = 2000
+
+
+def compact(statement: str) -> str:
+    return re.sub(r"\s+", " ", statement)[:MAX_STATEMENT_LENGTH]
+
+
+def parameters_shape(parameters, executemany: bool = False) -> str:
+    """Describes bound parameters by their types only, values are never logged."""
+    if executemany:
+        return f"{len(parameters)} x {parameters_shape(parameters[0]) if parameters else '()'}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    return "(" + ", ".join(type(value).__name__ for value in parameters or ()) + ")"
+
+
+class QueryLogger:
+    """Times every statement through engine events and logs the ones slower than the threshold.
+
+    A sample of slow SELECT statements is re-run with EXPLAIN (ANALYZE, BUFFERS) in a background task on a
+    separate connection, one plan at a time, so the capture never blocks the request that was slow.
+    """
+
+    def __init__(self, engine: AsyncEngine, config: SlowQueryLog):
+        self.engine = engine
+        self.config = config
+        self._explain_task: asyncio.Task | None = None
+        event.listen(engine.sync_engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", self.after_cursor_execute)
+
+    @staticmethod
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start_time"] = time.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("query_start_time", time.perf_counter())
+        statement = statement.strip()
+        if elapsed * 1000 < self.config.threshold_ms or statement[:7].upper() == "EXPLAIN":
+            return
+        SLOW_QUERIES.inc()
+        logger.warning(f"Slow query {elapsed * 1000:0.1f} ms, parameters {parameters_shape(parameters, executemany)}: "
+                       f"{compact(statement)}")
+        if self.should_explain(statement, executemany):
+            self._explain_task = asyncio.get_running_loop().create_task(self.explain(statement, parameters))
+
+    def should_explain(self, statement: str, executemany: bool) -> bool:
+        return (not executemany
+                and statement[:6].upper() == "SELECT"
+                and (self._explain_task is None or self._explain_task.done())
+                and random.random() < self.config.explain_sample_rate)
+
+    async def explain(self, statement: str, parameters):
+        try:
+            async with self.engine.connect() as conn:
+                result = await conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+                plan = "\n".join(row[0] for row in result)
+                await conn.rollback()
+            logger.warning(f"Plan of slow query {compact(statement)}:\n{plan}")
+        except DBAPIError as e:
+            logger.warning(f"Failed to explain slow query: {e.orig}")
+
+    async def close(self):
+        if self._explain_task and not self._explain_task.done():
+            self._explain_task.cancel()
+            try:
+                await self._explain_task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,287 @@
+import asyncio
+import datetime
+import heapq
+from dataclasses import dataclass
+
+import httpx
+import orjson
+from loguru import logger
+
+from task_planner.application.metrics import REMINDERS_PENDING, REMINDERS_SENT
+from task_planner.application.consistency import ReadConsistency, read_consistency
+from task_planner.configs.config import Config, Reminders
+from task_planner.workers.storage import Storage
+
+REMINDERS_LOCK_ID = 7_413_220_002
+
+
+@dataclass(frozen=True)
+class Reminder:
+    task_id: int
+    name: str
+    deadline: datetime.datetime
+    comment: str | None
+    remind_at: datetime.datetime
+
+    def to_dict(self) -> dict:
+        return {"id": self.task_id, "name": self.name, "deadline": self.deadline.isoformat(),
+                "comment": self.comment, "remind_at": self.remind_at.isoformat()}
+
+
+class ReminderSink:
+    name = ""
+
+    async def send(self, reminder: Reminder):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class LogSink(ReminderSink):
+    name = "log"
+
+    async def send(self, reminder: Reminder):
+        logger.info(f'Reminder: task {reminder.task_id} "{reminder.name}" is due {reminder.deadline:%Y-%m-%d %H:%M}')
+
+
+class WebhookSink(ReminderSink):
+    """POSTs every reminder as JSON to webhook_url."""
+    name = "webhook"
+
+    def __init__(self, config: Reminders):
+        self.url = config.webhook_url
+        self.client = httpx.AsyncClient(timeout=config.webhook_timeout)
+
+    async def send(self, reminder: Reminder):
+        response = await self.client.post(self.url, content=orjson.dumps(reminder.to_dict()),
+                                          headers={"Content-Type": "application/json"})
+        response.raise_for_status()
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class FileSink(ReminderSink):
+    """Appends every reminder to file_path as a JSON line."""
+    name = "file"
+
+    def __init__(self, config: Reminders):
+        self.path = config.file_path
+
+    async def send(self, reminder: Reminder):
+        await asyncio.to_thread(self.append, orjson.dumps(reminder.to_dict()) + b"\n")
+
+    def append(self, line: bytes):
+        with open(self.path, "ab") as file:
+            file.write(line)
+
+
+def create_sinks(config: Reminders) -> list[ReminderSink]:
+    sinks = {"log": lambda: LogSink(), "webhook": lambda: WebhookSink(config), "file": lambda: FileSink(config)}
+    return [sinks[name]() for name in config.sinks]
+
+
+class ReminderScheduler:
+    """Fires a reminder lead_minutes before the deadline of every open task.
+
+    Pending reminders are kept in a min-heap of (remind_at, task_id, deadline) with lazy deletion: a change
+    only updates the task's entry in `pending` and pushes a new heap item, items that no longer match
+    `pending` are dropped when they reach the top. The loop sleeps until the top item is due or an earlier
+    one is pushed, so the cost does not grow with the number of pending reminders.
+
+    Open tasks are read once on start; afterwards the heap follows the storage change events, reading
+    only the changed tasks. Reminders that fell due while the service was down are not sent.
+    With several processes on one database only the holder of an advisory lock runs reminders,
+    the others retry every leader_retry_seconds. The leader checks the lock as often; when it is lost
+    the leader drops its heap and goes back to waiting for the lock, so reminders are not sent twice.
+    """
+
+    def __init__(self, config: Config, storage: Storage):
+        self.config = config.reminders
+        self.storage = storage
+        self.lead = datetime.timedelta(minutes=self.config.lead_minutes)
+        self.sinks = create_sinks(self.config)
+        self.pending: dict[int, Reminder] = {}
+        self.heap: list[tuple[datetime.datetime, int, datetime.datetime]] = []
+        self.events: asyncio.Queue[dict] = asyncio.Queue()
+        self.wakeup = asyncio.Event()
+        self.send_slots = asyncio.Semaphore(self.config.max_concurrent_sends)
+        self.sending: set[asyncio.Task] = set()
+        self.ready = asyncio.Event()
+        self.lock_lost = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        self._tasks.append(asyncio.get_running_loop().create_task(self._run()))
+
+    async def _run(self):
+        while True:
+            await self._acquire_lock()
+            await self._lead()
+
+    async def _acquire_lock(self):
+        while True:
+            self.lock_lost.clear()
+            try:
+                if await self.storage.acquire_lock(REMINDERS_LOCK_ID, on_lost=self.lock_lost.set):
+                    return
+            except Exception as e:
+                logger.error(f'Failed to take the reminders lock: {e.__class__.__name__}, {e}')
+            await asyncio.sleep(self.config.leader_retry_seconds)
+
+    async def _lead(self):
+        """Runs reminders until the lock is lost."""
+        loop = asyncio.get_running_loop()
+        tasks = []
+        self.storage.subscribe(self.events.put_nowait)
+        try:
+            await self.load()
+            self.ready.set()
+            tasks = [loop.create_task(self._follow_changes()), loop.create_task(self._fire_due()),
+                     loop.create_task(self._watch_lock())]
+            await self.lock_lost.wait()
+        finally:
+            self.storage.unsubscribe(self.events.put_nowait)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        logger.warning('Reminders lock is lost, reminders are stopped until it is taken again')
+        self.ready.clear()
+        self.pending.clear()
+        self.heap.clear()
+        self.events = asyncio.Queue()
+        REMINDERS_PENDING.set(0)
+
+    async def _watch_lock(self):
+        while True:
+            await asyncio.sleep(self.config.leader_retry_seconds)
+            try:
+                held = await self.storage.holds_lock(REMINDERS_LOCK_ID)
+            except Exception as e:
+                logger.error(f'Failed to check the reminders lock: {e.__class__.__name__}, {e}')
+                held = False
+            if not held:
+                self.lock_lost.set()
+                return
+
+    async def load(self):
+        """Rebuilds the heap from the open tasks whose reminder is still ahead."""
+        start_time = datetime.datetime.now()
+        self.pending.clear()
+        self.heap.clear()
+        async for rows in self.storage.stream_tasks(chunk_size=self.config.load_chunk_size,
+                                                    from_date=start_time + self.lead, done=False):
+            for task_id, name, deadline, comment, _ in rows:
+                reminder = Reminder(task_id, name, deadline, comment, deadline - self.lead)
+                self.pending[task_id] = reminder
+                self.heap.append((reminder.remind_at, task_id, deadline))
+        heapq.heapify(self.heap)
+        REMINDERS_PENDING.set(len(self.pending))
+        self.wakeup.set()
+        logger.info(f'Loaded {len(self.pending)} pending reminders in '
+                    f'{(datetime.datetime.now() - start_time).total_seconds():0.3f} seconds')
+
+    def cancel(self, task_id: int):
+        self.pending.pop(task_id, None)
+        REMINDERS_PENDING.set(len(self.pending))
+
+    def schedule(self, task_id: int, name: str, deadline: datetime.datetime, comment: str | None, done: bool):
+        """Adds, moves or cancels the reminder of one task."""
+        remind_at = deadline - self.lead
+        if done or remind_at < datetime.datetime.now():
+            self.pending.pop(task_id, None)
+        else:
+            reminder = Reminder(task_id, name, deadline, comment, remind_at)
+            current = self.pending.get(task_id)
+            self.pending[task_id] = reminder
+            if current is None or current.remind_at != remind_at:
+                heapq.heappush(self.heap, (remind_at, task_id, deadline))
+                if self.heap[0][1] == task_id:
+                    self.wakeup.set()
+        REMINDERS_PENDING.set(len(self.pending))
+        if len(self.heap) > 2 * len(self.pending) + 1000:
+            self.heap = [(r.remind_at, r.task_id, r.deadline) for r in self.pending.values()]
+            heapq.heapify(self.heap)
+
+    async def apply(self, event: dict):
+        if event.get("resync"):
+            await self.load()
+            return
+        ids = event.get("ids", [])
+        tasks = list(await self.storage.get_tasks(task_ids=ids, for_calendar=True)) if ids else []
+        found = {task.id for task in tasks}
+        for task_id in set(ids) - found:
+            self.cancel(task_id)
+        if event.get("truncated"):
+            tasks += await self._month_tasks(event.get("months", ()), found)
+        for task in tasks:
+            self.schedule(task.id, task.name, task.deadline, task.comment, task.done)
+
+    async def _month_tasks(self, months, found: set[int]) -> list:
+        """Reconciles the months of an event with too many ids to list: re-reads their tasks and cancels
+        reminders of tasks in those months that are gone."""
+        tasks = []
+        for month in months:
+            year, month = map(int, month.split('-'))
+            from_date = datetime.datetime(year, month, 1)
+            to_date = datetime.datetime(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(microseconds=1)
+            month_tasks = await self.storage.get_tasks(from_date=from_date, to_date=to_date, for_calendar=True)
+            seen = {task.id for task in month_tasks}
+            for reminder in list(self.pending.values()):
+                if from_date <= reminder.deadline <= to_date and reminder.task_id not in seen:
+                    self.cancel(reminder.task_id)
+            tasks += [task for task in month_tasks if task.id not in found]
+        return tasks
+
+    async def _follow_changes(self):
+        # Changed tasks are read right after the write, before a replica may have it.
+        read_consistency.set(ReadConsistency(wrote=True))
+        while True:
+            event = await self.events.get()
+            try:
+                await self.apply(event)
+            except Exception as e:
+                logger.error(f'Failed to update reminders: {e.__class__.__name__}, {e}')
+
+    async def _fire_due(self):
+        while not self.lock_lost.is_set():
+            self.wakeup.clear()
+            now = datetime.datetime.now()
+            while self.heap and self.heap[0][0] <= now and not self.lock_lost.is_set():
+                remind_at, task_id, deadline = heapq.heappop(self.heap)
+                reminder = self.pending.get(task_id)
+                if reminder is None or reminder.remind_at != remind_at or reminder.deadline != deadline:
+                    continue
+                del self.pending[task_id]
+                task = asyncio.get_running_loop().create_task(self.send(reminder))
+                self.sending.add(task)
+                task.add_done_callback(self.sending.discard)
+            REMINDERS_PENDING.set(len(self.pending))
+            timeout = (self.heap[0][0] - now).total_seconds() if self.heap else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def send(self, reminder: Reminder):
+        async with self.send_slots:
+            for sink in self.sinks:
+                try:
+                    await sink.send(reminder)
+                    REMINDERS_SENT.inc(sink.name, "ok")
+                except Exception as e:
+                    REMINDERS_SENT.inc(sink.name, "error")
+                    logger.error(f'Reminder sink {sink.name} failed for task {reminder.task_id}: '
+                                 f'{e.__class__.__name__}, {e}')
+
+    def upcoming(self, limit: int) -> list[Reminder]:
+        return heapq.nsmallest(limit, self.pending.values(), key=lambda reminder: (reminder.remind_at, reminder.task_id))
+
+    async def close(self):
+        self.storage.unsubscribe(self.events.put_nowait)
+        for task in self._tasks + list(self.sending):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self.sending, return_exceptions=True)
+        for sink in self.sinks:
+            await sink.close()
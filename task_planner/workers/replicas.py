@@ -0,0 +1,102 @@
+import asyncio
+import random
+from dataclasses import dataclass
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from task_planner.application.consistency import primary_required
+from task_planner.application.metrics import DB_READS, DB_REPLICA_UP
+from task_planner.configs.config import DB
+
+HEALTH_CHECK = text("SELECT 1")
+
+
+@dataclass
+class ReadTarget:
+    name: str
+    engine: AsyncEngine
+    session_maker: async_sessionmaker
+    weight: float = 1
+    healthy: bool = True
+
+
+def is_unavailable(error: BaseException) -> bool:
+    """Whether the error means the database could not be reached, as opposed to a failing query."""
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated or isinstance(error.orig, OSError)
+    return isinstance(error, (OSError, asyncio.TimeoutError))
+
+
+class ReadRouter:
+    """Chooses the database for read-only queries: a healthy replica picked at random by weight, or the primary
+    when no replica is healthy or the current client must see its own writes (see application.consistency).
+
+    Replicas are checked with SELECT 1 every replica_check_interval seconds. A replica that fails a check or
+    a query is taken out of rotation until it passes a check again.
+    """
+
+    def __init__(self, config: DB, primary: ReadTarget, replicas: list[ReadTarget]):
+        self.config = config
+        self.primary = primary
+        self.replicas = replicas
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        if not self.replicas:
+            return
+        await self.check_all()
+        self._task = asyncio.get_running_loop().create_task(self._watch())
+
+    def choose(self, primary: bool = False) -> ReadTarget:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if primary or not healthy or primary_required():
+            target = self.primary
+        else:
+            target = random.choices(healthy, weights=[replica.weight for replica in healthy])[0]
+        DB_READS.inc(target.name)
+        return target
+
+    def mark_down(self, replica: ReadTarget, error: BaseException):
+        if replica.healthy:
+            logger.warning(f'Replica {replica.name} is out of rotation: {error.__class__.__name__}, {error}')
+        replica.healthy = False
+        DB_REPLICA_UP.set(0, replica.name)
+
+    async def check(self, replica: ReadTarget):
+        try:
+            async with asyncio.timeout(self.config.replica_check_timeout):
+                async with replica.engine.connect() as conn:
+                    await conn.execute(HEALTH_CHECK)
+        except Exception as e:
+            if not is_unavailable(e):
+                raise
+            self.mark_down(replica, e)
+            return
+        if not replica.healthy:
+            logger.info(f'Replica {replica.name} is back in rotation')
+        replica.healthy = True
+        DB_REPLICA_UP.set(1, replica.name)
+
+    async def check_all(self):
+        await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.config.replica_check_interval)
+            try:
+                await self.check_all()
+            except Exception as e:
+                logger.error(f'Replica health check failed: {e.__class__.__name__}, {e}')
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for replica in self.replicas:
+            await replica.engine.dispose()
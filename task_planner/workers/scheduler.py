@@ -0,0 +1,39 @@
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from loguru import logger
+
+from task_planner.configs.config import Config
+from task_planner.workers.storage import Storage
+
+
+def create_scheduler(config: Config, db_worker: Storage) -> AsyncIOScheduler:
+    scheduler = AsyncIOScheduler()
+    if config.purge.enabled:
+        scheduler.add_job(
+            db_worker.purge_done_tasks,
+            "interval",
+            minutes=config.purge.interval_minutes,
+            id="purge_done_tasks",
+            max_instances=1,
+            coalesce=True,
+        )
+        logger.info(f'Purge of done tasks scheduled every {config.purge.interval_minutes} minutes')
+    if config.archive.enabled:
+        scheduler.add_job(
+            db_worker.archive_old_done_tasks,
+            "interval",
+            minutes=config.archive.interval_minutes,
+            id="archive_done_tasks",
+            max_instances=1,
+            coalesce=True,
+        )
+        logger.info(f'Archive of done tasks scheduled every {config.archive.interval_minutes} minutes')
+    if db_worker.partitioned:
+        scheduler.add_job(
+            db_worker.create_partitions,
+            "interval",
+            hours=config.partitioning.interval_hours,
+            id="create_partitions",
+            max_instances=1,
+            coalesce=True,
+        )
+    return scheduler
@@ -0,0 +1,325 @@
+import calendar
+import datetime
+import uuid
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Callable, Iterable
+
+from loguru import logger
+
+from task_planner.application.models import Task
+from task_planner.application.cache import LRUCache
+from task_planner.application.benchmarking import measure_time
+from task_planner.application.metrics import CHANGE_EVENTS
+from task_planner.application.consistency import record_write
+from task_planner.configs.config import Config
+from task_planner.application.utils import encode_cursor, decode_cursor
+
+MAX_EVENT_IDS = 100
+MAINTENANCE_LOCK_ID = 7_413_220_004
+
+
+def change_event(worker_id: str, ids: Iterable[int], deadlines: Iterable[datetime.datetime | None]) -> dict:
+    """Builds the change event sent to subscribers and other workers: the writer, the changed task ids
+    (at most MAX_EVENT_IDS, so the payload stays small) and the affected deadline months as YYYY-MM."""
+    ids = sorted(set(ids))
+    return {
+        "worker": worker_id,
+        "ids": ids[:MAX_EVENT_IDS],
+        "truncated": len(ids) > MAX_EVENT_IDS,
+        "months": sorted({f'{d.year:04d}-{d.month:02d}' for d in deadlines if d}),
+    }
+
+
+class Storage(ABC):
+    """Task storage used by the handlers.
+
+    Backends implement reads and writes; pagination, the month calendar with its cache and the year
+    density are built here on top of get_tasks and count_tasks_by_period.
+
+    Every write reports the deadlines it touched to mark_changed(), which bumps the table version and
+    the versions of the affected months. Versions live in the process and start over on restart,
+    so validators built from them include boot_id.
+
+    Every change is also published as a change_event() to the callbacks registered with subscribe().
+    Changes made by other workers arrive through apply_change(), see start_listener().
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.calendar_cache = LRUCache(max_size=config.cache.calendar_size, ttl=config.cache.calendar_ttl)
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.table_version = 0
+        self.started_at = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        self.modified_at = self.started_at
+        self.months_modified: dict[tuple[int, int], datetime.datetime] = {}
+        self.worker_id = self.boot_id
+        self.subscribers: list[Callable[[dict], None]] = []
+        self.partitioned = False
+
+    @abstractmethod
+    async def init(self):
+        ...
+
+    @abstractmethod
+    async def get_tasks(self,
+                        name: str | None = None,
+                        task_id: int | None = None,
+                        task_ids: list[int] | None = None,
+                        from_date: datetime.datetime | None = None,
+                        to_date: datetime.datetime | None = None,
+                        comment: str | None = None,
+                        done: bool | None = None,
+                        for_calendar: bool = False,
+                        limit: int | None = None,
+                        after: tuple[datetime.datetime, int] | None = None,
+                        include_archived: bool = False) -> list[Task]:
+        """Returns tasks matching the filters, ordered by (deadline, id) and after the given key when limited.
+        Archived tasks are included only with include_archived.
+        Raises TaskNotFoundError if nothing matches, unless for_calendar is set."""
+
+    @abstractmethod
+    async def get_task_rows(self,
+                            limit: int,
+                            after: tuple[datetime.datetime, int] | None = None,
+                            **filters) -> list[tuple]:
+        """Returns up to limit (id, name, deadline, comment, done) rows ordered by (deadline, id),
+        without building Task objects."""
+
+    @abstractmethod
+    def stream_tasks(self, chunk_size: int = 1000, **filters) -> AsyncIterator[list[tuple]]:
+        """Yields lists of (id, name, deadline, comment, done) rows ordered by (deadline, id)."""
+
+    @abstractmethod
+    async def search_tasks(self, search_text: str, limit: int, **filters) -> list[Task]:
+        ...
+
+    @abstractmethod
+    async def count_tasks(self,
+                          name: str | None = None,
+                          from_date: datetime.datetime | None = None,
+                          to_date: datetime.datetime | None = None,
+                          done: bool | None = None) -> dict[str, int]:
+        """Returns total, done, open and open tasks by deadline bucket: overdue, today, week, later."""
+
+    @abstractmethod
+    async def add_task(self, name: str, deadline: datetime.datetime, comment: str) -> int:
+        """Returns the id of the new task, raises TaskAlreadyExistsError for a taken (name, deadline)."""
+
+    @abstractmethod
+    async def import_tasks(self, records: list[tuple]) -> dict[int, bool]:
+        """Inserts (row_num, name, deadline, comment, done) records, returns row_num -> whether it was inserted."""
+
+    @abstractmethod
+    async def batch_tasks(self,
+                          updates: list[dict] | None = None,
+                          delete_ids: list[int] | None = None) -> list[tuple[int, str, str]]:
+        """Applies all updates and deletes or none of them, returns (id, action, status) in request order."""
+
+    @abstractmethod
+    async def count_tasks_by_period(self,
+                                    from_date: datetime.datetime,
+                                    to_date: datetime.datetime,
+                                    period: str = 'day') -> dict[datetime.date, dict[str, int]]:
+        """Counts tasks per deadline day or month in [from_date, to_date)."""
+
+    @abstractmethod
+    async def update_task(self,
+                          name: str,
+                          deadline: datetime.datetime,
+                          new_deadline: datetime.datetime | None = None,
+                          comment: str | None = None,
+                          done: bool | None = None) -> Task:
+        ...
+
+    @abstractmethod
+    async def delete_task(self, name: str, deadline: datetime.datetime):
+        ...
+
+    @abstractmethod
+    async def delete_done_tasks(self,
+                                older_than: datetime.datetime | None = None,
+                                batch_size: int | None = None) -> int:
+        ...
+
+    @abstractmethod
+    async def archive_done_tasks(self, older_than: datetime.datetime, batch_size: int | None = None) -> int:
+        """Moves done tasks with a deadline before older_than to the archive, returns how many were moved."""
+
+    @abstractmethod
+    async def close(self):
+        ...
+
+    def pool_status(self) -> dict[str, int]:
+        return {}
+
+    async def start_listener(self):
+        """Starts receiving changes made by other processes; a single-process backend has none."""
+
+    async def acquire_lock(self, lock_id: int, on_lost: Callable[[], None] | None = None) -> bool:
+        """Takes a lock shared by all processes using the storage and held until close(). on_lost is called
+        if the lock is released by a failure meanwhile. A single-process backend always gets it."""
+        return True
+
+    async def holds_lock(self, lock_id: int) -> bool:
+        """Checks that the lock taken with acquire_lock() is still held."""
+        return True
+
+    async def create_partitions(self) -> int:
+        """Creates the storage partitions for the coming months, returns how many were created.
+        Only a partitioned database has any, see `partitioned`."""
+        return 0
+
+    @measure_time
+    async def paginate_tasks(self,
+                             limit: int,
+                             cursor: str | None = None,
+                             **filters) -> tuple[list[Task], str | None]:
+        """Returns one keyset page ordered by (deadline, id) and the cursor of the next page, if any."""
+        tasks = await self.get_tasks(limit=limit + 1, after=decode_cursor(cursor), **filters)
+        if len(tasks) <= limit:
+            return tasks, None
+        tasks = tasks[:limit]
+        return tasks, encode_cursor(tasks[-1].deadline, tasks[-1].id)
+
+    @measure_time
+    async def paginate_task_rows(self,
+                                 limit: int,
+                                 cursor: str | None = None,
+                                 **filters) -> tuple[list[tuple], str | None]:
+        """paginate_tasks over plain (id, name, deadline, comment, done) rows."""
+        rows = await self.get_task_rows(limit=limit + 1, after=decode_cursor(cursor), **filters)
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1][2], rows[-1][0])
+
+    def mark_changed(self, *deadlines: datetime.datetime | None, ids: Iterable[int] = ()):
+        event = change_event(self.worker_id, ids, deadlines)
+        if not event["months"]:
+            return
+        self._invalidate(event["months"])
+        record_write()
+        CHANGE_EVENTS.inc("local")
+        self.publish(event)
+
+    def apply_change(self, event: dict):
+        """Invalidates the months of a change made by another worker and passes the event to subscribers."""
+        if event.get("worker") == self.worker_id:
+            return
+        self._invalidate(event.get("months", ()))
+        CHANGE_EVENTS.inc("remote")
+        self.publish(event)
+
+    def resync(self):
+        """Drops every cached month and changes every validator after change events may have been missed."""
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.calendar_cache.clear()
+        self.started_at = self.modified_at = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        self.months_modified.clear()
+        self.publish({"worker": self.worker_id, "resync": True})
+
+    def _invalidate(self, months: Iterable[str]):
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        self.table_version += 1
+        self.modified_at = now
+        for month in months:
+            year, month = map(int, month.split('-'))
+            self.calendar_cache.invalidate((year, month))
+            self.months_modified[(year, month)] = now
+
+    def subscribe(self, callback: Callable[[dict], None]):
+        """Registers a callback for every change event. Callbacks run on the event loop and must not block."""
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[dict], None]):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def publish(self, event: dict):
+        for callback in list(self.subscribers):
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f'Change subscriber {callback!r} failed: {e.__class__.__name__}, {e}')
+
+    def table_validator(self) -> tuple[str, datetime.datetime]:
+        """Returns the (version tag, last modification time) of the whole task table."""
+        return f'{self.boot_id}-{self.table_version}', self.modified_at
+
+    def month_validator(self, year: int, month: int) -> tuple[str, datetime.datetime]:
+        """Returns the (version tag, last modification time) of the tasks due in the month."""
+        version = self.calendar_cache.version((year, month))
+        return f'{self.boot_id}-{year}-{month}-{version}', self.months_modified.get((year, month), self.started_at)
+
+    @measure_time
+    async def get_year_density(self, year: int, per_day: bool = False) -> dict[str, dict]:
+        """Task counts per month (and optionally per day) of the year from a single aggregate query."""
+        from_date = datetime.datetime(year=year, month=1, day=1)
+        to_date = datetime.datetime(year=year + 1, month=1, day=1)
+        counts = await self.count_tasks_by_period(from_date=from_date, to_date=to_date,
+                                                  period='day' if per_day else 'month')
+        months = {month: {'total': 0, 'done': 0, 'open': 0} for month in range(1, 13)}
+        for date, day_counts in counts.items():
+            for key, value in day_counts.items():
+                months[date.month][key] += value
+        days = None
+        if per_day:
+            empty = {'total': 0, 'done': 0, 'open': 0}
+            days = {}
+            date = from_date.date()
+            while date.year == year:
+                days[date.strftime('%Y-%m-%d')] = counts.get(date, empty)
+                date += datetime.timedelta(days=1)
+        return {'months': months, 'days': days}
+
+    @measure_time
+    async def generate_calendar(self, year: int, month: int) -> dict[str, dict[str, int]]:
+        days = self.calendar_cache.get((year, month))
+        if days is not None:
+            return days
+        version = self.calendar_cache.version((year, month))
+        last_day = calendar.monthrange(year, month)[1]
+        from_date = datetime.datetime(year=year, month=month, day=1)
+        to_date = from_date + datetime.timedelta(days=last_day)
+        counts = await self.count_tasks_by_period(from_date=from_date, to_date=to_date)
+        empty = {'total': 0, 'done': 0, 'open': 0}
+        days = {f"{year}-{month:02d}-{day:02d}": counts.get(datetime.date(year, month, day), empty)
+                for day in range(1, last_day + 1)}
+
+        self.calendar_cache.set((year, month), days, version)
+        return days
+
+    async def _leads_maintenance(self) -> bool:
+        """Whether this process runs the purge and archive jobs. The first process to take the maintenance
+        lock keeps it until close(), the jobs of the others skip their runs; if the lock is lost, the next
+        run of any process takes it again."""
+        if await self.holds_lock(MAINTENANCE_LOCK_ID):
+            return True
+        if await self.acquire_lock(MAINTENANCE_LOCK_ID):
+            logger.info('This worker runs the purge and archive jobs')
+            return True
+        logger.debug('Purge and archive jobs run in another worker')
+        return False
+
+    async def purge_done_tasks(self):
+        if not await self._leads_maintenance():
+            return
+        older_than = datetime.datetime.now() - datetime.timedelta(days=self.config.purge.older_than_days)
+        deleted = await self.delete_done_tasks(older_than=older_than)
+        logger.info(f'Purge job deleted {deleted} done tasks older than {older_than:%Y-%m-%d}')
+
+    async def archive_old_done_tasks(self):
+        if not await self._leads_maintenance():
+            return
+        older_than = datetime.datetime.now() - datetime.timedelta(days=self.config.archive.older_than_days)
+        archived = await self.archive_done_tasks(older_than=older_than)
+        logger.info(f'Archive job moved {archived} done tasks older than {older_than:%Y-%m-%d} to the archive')
+
+
+def create_storage(config: Config) -> Storage:
+    """Creates the backend selected by storage.backend, only the chosen one's driver is imported."""
+    if config.storage.backend == 'memory':
+        from task_planner.workers.memory_worker import MemoryWorker
+        return MemoryWorker(config)
+    from task_planner.workers.db_worker import DBWorker
+    return DBWorker(config)
@@ -1,11 +1,20 @@
+import asyncio
+import datetime
 import pytest
+import gzip
+import time
 import os
 import sys
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from fastapi.testclient import TestClient
+from loguru import logger
 from task_planner.main import app
+from task_planner.configs.config import load_config
+from task_planner.workers.migrations import migrate, LATEST_VERSION
+from task_planner.application.models import TasksInfoResponse
+from task_planner.handlers.tasks_handler import csv_chunks
 
 # @pytest.fixture(scope="session", autouse=True)
 # def set_test_config():
@@ -16,6 +25,9 @@ from task_planner.main import app
 
 @pytest.fixture(scope="session")
 def client():
+    config = load_config()
+    if config.storage.backend == "postgres":
+        asyncio.run(migrate(config))
     with TestClient(app) as test_client:
         yield test_client
 
@@ -62,6 +74,12 @@ def test_show_all_tasks_no_tasks(client):
     assert "/show_task/" not in response.text
 
 
+def test_download_no_tasks(client):
+    response = client.get("/download")
+    assert response.status_code == 404
+    assert "Не найдено задач для скачивания" in response.text
+
+
 def test_add_task_ok(client):
     response = client.post("/add_task", data={
         "name": "Test Task",
@@ -179,6 +197,170 @@ def test_search_task_by_status_failure(client):
     assert "Задачи по данным фильтрам не найдены" in response.text
 
 
+def test_search_task_by_text_ok(client):
+    response = client.post("/search_task", data={"text": "tes"})
+    assert response.status_code == 200
+    assert "/show_task/" in response.text
+
+
+def test_search_task_by_text_failure(client):
+    response = client.post("/search_task", data={"text": "nothing"})
+    assert response.status_code == 404
+    assert "Задачи по данным фильтрам не найдены" in response.text
+
+
+def test_api_search_tasks(client):
+    response = client.get("/api/tasks/search", params={"q": "test task"}, auth=("test", "test"))
+    assert response.status_code == 200
+    assert response.json()["tasks_info"][0]["name"] == "Test task"
+    response = client.get("/api/tasks/search", params={"q": "test task", "limit": -5}, auth=("test", "test"))
+    assert response.status_code == 422
+
+
+def test_task_info_case_insensitive(client):
+    response = client.post("/api/task_info", json={"task_name": "TEST TASK"}, auth=("test", "test"))
+    assert response.status_code == 200
+    assert len(response.json()["tasks_info"]) == 1
+
+
+def test_tasks_count_ok(client):
+    response = client.get("/api/tasks_count", auth=("test", "test"))
+    assert response.status_code == 200
+    data = response.json()
+    assert data["tasks_count"] == 1
+    assert data["open_count"] == 1
+    assert data["done_count"] == 0
+    assert sum(data["deadline_buckets"].values()) == 1
+
+
+def test_tasks_count_with_filters(client):
+    response = client.get("/api/tasks_count", params={"name": "Test task", "done": "true"}, auth=("test", "test"))
+    assert response.status_code == 200
+    assert response.json()["tasks_count"] == 0
+    response = client.get("/api/tasks_count", params={"start_date": "2025-10-01", "end_date": "2025-10-31"},
+                          auth=("test", "test"))
+    assert response.json()["tasks_count"] == 1
+
+
+def test_tasks_info_page(client):
+    response = client.get("/api/tasks_info", params={"limit": 1}, auth=("test", "test"))
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["tasks_info"]) == 1
+    assert data["next_cursor"] is None
+    assert TasksInfoResponse.model_validate(data).tasks_info[0].name == data["tasks_info"][0]["name"]
+
+
+def test_tasks_info_wrong_cursor(client):
+    response = client.get("/api/tasks_info", params={"cursor": "wrong"}, auth=("test", "test"))
+    assert response.status_code == 422
+
+
+def test_show_tasks_wrong_cursor_and_empty_day(client):
+    assert client.get("/show_tasks/2025-10-10", params={"cursor": "wrong"}).status_code == 422
+    assert client.get("/show_tasks/2024-01-01").status_code == 404
+
+
+def test_tasks_info_wrong_limit(client):
+    for limit in (0, -5):
+        response = client.get("/api/tasks_info", params={"limit": limit}, auth=("test", "test"))
+        assert response.status_code == 422
+
+
+def test_download_closes_rows_on_disconnect():
+    closed = []
+
+    async def rows_chunks():
+        try:
+            while True:
+                yield [(1, "Task", datetime.datetime(2025, 3, 1), "", False)]
+        finally:
+            closed.append(True)
+
+    async def scenario():
+        rows = rows_chunks()
+        chunks = csv_chunks(await anext(rows), rows)
+        await anext(chunks)
+        await anext(chunks)
+        await chunks.aclose()
+
+    asyncio.run(scenario())
+    assert closed == [True]
+
+
+def test_download_ok(client):
+    response = client.get("/download", params={"name": "Test Task"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "Test task" in response.text
+
+
+def test_download_compressed(client):
+    response = client.get("/download", params={"compress": "true"})
+    assert response.status_code == 200
+    assert "Test task" in gzip.decompress(response.content).decode("utf-8")
+
+
+def test_read_calendar_cached(client):
+    stats_before = client.get("/api/cache_stats", auth=("test", "test")).json()
+    for _ in range(2):
+        response = client.get("/read_calendar/2025/10")
+        assert response.status_code == 200
+        assert "/show_tasks/2025-10-10" in response.text
+        assert "0/1" in response.text
+    stats_after = client.get("/api/cache_stats", auth=("test", "test")).json()
+    assert stats_after["fragments"]["hits"] > stats_before["fragments"]["hits"]
+    assert stats_after["calendar"]["misses"] - stats_before["calendar"]["misses"] <= 1
+
+
+def test_static_page_cached(client):
+    response = client.get("/add_task_page")
+    assert response.status_code == 200
+    assert 'href="/static/styles.css"' in response.text
+    assert response.headers["cache-control"].startswith("public")
+    response = client.get("/add_task_page", headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
+
+
+def test_conditional_requests(client):
+    tasks_info = client.get("/api/tasks_info", auth=("test", "test"))
+    calendar = client.get("/read_calendar/2025/10")
+    assert tasks_info.headers["etag"] != calendar.headers["etag"]
+    assert "last-modified" in calendar.headers
+    response = client.get("/api/tasks_info", headers={"If-None-Match": tasks_info.headers["etag"]}, auth=("test", "test"))
+    assert response.status_code == 304
+    assert response.content == b""
+    client.post("/add_task", data={"name": "Etag Task", "year": "2025", "month": "12", "day": "15", "comment": ""})
+    response = client.get("/read_calendar/2025/10", headers={"If-None-Match": calendar.headers["etag"]})
+    assert response.status_code == 304
+    response = client.get("/api/tasks_info", headers={"If-None-Match": tasks_info.headers["etag"]}, auth=("test", "test"))
+    assert response.status_code == 200
+    assert response.headers["etag"] != tasks_info.headers["etag"]
+    client.post("/delete_task", data={"name": "Etag Task", "year": "2025", "month": "12", "day": "15"})
+
+
+def test_year_density(client):
+    response = client.get("/api/year_density/2025", params={"per_day": "true"}, auth=("test", "test"))
+    assert response.status_code == 200
+    data = response.json()
+    assert data["months"]["10"]["total"] == 1
+    assert data["days"]["2025-10-10"]["open"] == 1
+    assert len(data["days"]) == 365
+
+
+def test_year_density_wrong_year(client):
+    for year in (0, -1, 10000):
+        assert client.get(f"/api/year_density/{year}", auth=("test", "test")).status_code == 422
+        assert client.get("/year_calendar", params={"year": year}).status_code == 422
+
+
+def test_year_calendar_heatmap(client):
+    response = client.get("/year_calendar", params={"year": 2025, "heatmap": "true"})
+    assert response.status_code == 200
+    assert "Октябрь (0/1)" in response.text
+    assert "2025-10-10: 1" in response.text
+
+
 def test_update_task_ok(client):
     response = client.post("/update_task", data={
         "name": "Test Task",
@@ -238,6 +420,13 @@ def test_show_all_tasks_ok(client):
     assert "/show_task/" in response.text
 
 
+def test_read_calendar_after_update(client):
+    response = client.get("/read_calendar/2025/10")
+    assert "/show_tasks/2025-10-10" not in response.text
+    response = client.get("/read_calendar/2025/11")
+    assert "/show_tasks/2025-11-11" in response.text
+
+
 def test_delete_task_ok(client):
     response = client.post("/delete_task", data={
         "name": "Test Task",
@@ -249,6 +438,12 @@ def test_delete_task_ok(client):
     assert "Задача удалена" in response.text
 
 
+def test_read_calendar_invalidated(client):
+    response = client.get("/read_calendar/2025/11")
+    assert response.status_code == 200
+    assert "/show_tasks/2025-11-11" not in response.text
+
+
 def test_delete_task_not_found(client):
     response = client.post("/delete_task", data={
         "name": "Test Task",
@@ -267,3 +462,202 @@ def test_delete_task_bad_request(client):
     assert response.status_code == 422
     assert "Чтобы удалить задачу введите её название и срок выполнения." in response.text
 
+
+
+def test_import_tasks_csv(client):
+    content = ("id,Название,Выполнить до,Комментарий,Выполнено\n"
+               ",Imported task,2025-12-20,Comment,Нет\n"
+               ",Bad task,2025-13-40,Comment,Нет\n"
+               ",imported task,2025-12-20,Duplicate,Нет\n")
+    response = client.post("/api/tasks/import", files={"file": ("tasks.csv", content.encode("utf-8"), "text/csv")},
+                           auth=("test", "test"))
+    assert response.status_code == 200
+    data = response.json()
+    assert data["imported"] == 1
+    assert data["failed"] == 2
+    assert [error["row"] for error in data["errors"]] == [3, 4]
+
+
+def test_import_tasks_ndjson(client):
+    content = ('{"name": "Imported task", "deadline": "2025-12-20"}\n'
+               '{"name": "Json task", "deadline": "2025-12-21", "comment": "From json", "done": true}\n'
+               'not json\n')
+    response = client.post("/api/tasks/import", files={"file": ("tasks.ndjson", content.encode("utf-8"))},
+                           auth=("test", "test"))
+    assert response.status_code == 200
+    data = response.json()
+    assert data["imported"] == 1
+    assert [error["row"] for error in data["errors"]] == [1, 3]
+
+
+def test_batch_tasks(client):
+    tasks = client.get("/api/tasks_info", auth=("test", "test")).json()["tasks_info"]
+    ids = {task["name"]: task["id"] for task in tasks}
+    response = client.post("/api/tasks/batch", json={
+        "update": [{"ids": [ids["Imported task"], ids["Json task"]], "done": True, "comment": "Closed"}],
+        "delete": [ids["Json task"], 999999],
+    }, auth=("test", "test"))
+    assert response.status_code == 200
+    assert response.json()["results"] == [
+        {"id": ids["Imported task"], "action": "update", "status": "updated"},
+        {"id": ids["Json task"], "action": "update", "status": "updated"},
+        {"id": ids["Json task"], "action": "delete", "status": "deleted"},
+        {"id": 999999, "action": "delete", "status": "not_found"},
+    ]
+    response = client.get("/api/tasks_count", params={"done": "true"}, auth=("test", "test"))
+    assert response.json()["tasks_count"] == 1
+
+
+def test_batch_tasks_empty_update(client):
+    response = client.post("/api/tasks/batch", json={"update": [{"ids": [1]}]}, auth=("test", "test"))
+    assert response.status_code == 422
+
+
+def test_delete_done_tasks_ok(client):
+    client.post("/add_task", data={"name": "Done Task", "year": "2025", "month": "12", "day": "1", "comment": "Done."})
+    client.post("/update_task", data={"name": "Done Task", "year": "2025", "month": "12", "day": "1", "done": "True"})
+    response = client.post("/delete_task", data={"done": "True"})
+    assert response.status_code == 200
+    assert "Задачи удалены" in response.text
+    response = client.get("/api/tasks_count", params={"done": "true"}, auth=("test", "test"))
+    assert response.json()["tasks_count"] == 0
+
+
+def test_archived_task_found_on_request(client):
+    db_worker = client.app.state.db_worker
+    client.portal.call(db_worker.import_tasks, [(1, "Archived Task", datetime.datetime(2020, 3, 1), "", True)])
+    assert client.portal.call(db_worker.archive_done_tasks, datetime.datetime(2021, 1, 1)) == 1
+    request = {"task_name": "Archived Task", "done": True}
+    response = client.post("/api/task_info", json=request, auth=("test", "test"))
+    assert response.status_code == 404
+    response = client.post("/api/task_info", json=request | {"include_archived": True}, auth=("test", "test"))
+    tasks_info = response.json()["tasks_info"]
+    assert [task["name"] for task in tasks_info] == ["Archived Task"]
+    response = client.post("/search_task", data={"name": "Archived Task", "include_archived": "True"})
+    assert f'/show_task/{tasks_info[0]["id"]}' in response.text
+    assert client.get(f'/show_task/{tasks_info[0]["id"]}').status_code == 200
+
+
+def test_metrics(client):
+    assert client.get("/metrics").status_code == 401
+    response = client.get("/metrics", auth=("test", "test"))
+    assert response.status_code == 200
+    assert 'task_planner_http_request_duration_seconds_bucket{method="GET",route="/read_calendar/{year}/{month}"' \
+           in response.text
+    assert 'task_planner_function_duration_seconds_count{function="Storage.generate_calendar"}' in response.text
+    if client.app.state.config.storage.backend == "postgres":
+        assert 'task_planner_db_pool_connections{state="size"}' in response.text
+
+
+def test_slow_query_log(client):
+    if client.app.state.config.storage.backend != "postgres":
+        pytest.skip("slow query log is recorded for the postgres backend only")
+    messages = []
+    sink_id = logger.add(messages.append, level="WARNING", format="{message}")
+    slow_query_log = client.app.state.config.slow_query_log
+    defaults = slow_query_log.threshold_ms, slow_query_log.explain_sample_rate
+    try:
+        slow_query_log.threshold_ms, slow_query_log.explain_sample_rate = 0, 1
+        response = client.get("/api/tasks_info", params={"limit": 1}, auth=("test", "test"))
+        assert response.status_code == 200
+        for _ in range(50):
+            if any("Plan of slow query" in message for message in messages):
+                break
+            time.sleep(0.05)
+    finally:
+        slow_query_log.threshold_ms, slow_query_log.explain_sample_rate = defaults
+        logger.remove(sink_id)
+    assert any("Slow query" in message and "FROM tasks_data" in message for message in messages)
+    assert any("Plan of slow query" in message and "Buffers" in message for message in messages)
+
+
+def test_migrations_are_idempotent(client):
+    if client.app.state.config.storage.backend != "postgres":
+        pytest.skip("schema migrations apply to the postgres backend only")
+    assert asyncio.run(migrate(client.app.state.config, create_db=False)) == LATEST_VERSION
+
+
+def wait_for(condition, attempts: int = 100):
+    for _ in range(attempts):
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_change_events(client):
+    db_worker = client.app.state.db_worker
+    events = []
+    db_worker.subscribe(events.append)
+    try:
+        response = client.post("/add_task", data={
+            "name": "Event Task", "year": "2031", "month": "4", "day": "2", "comment": ""
+        })
+        assert "Задача добавлена" in response.text
+    finally:
+        db_worker.unsubscribe(events.append)
+    assert [(event["worker"], event["months"]) for event in events] == [(db_worker.worker_id, ["2031-04"])]
+    assert len(events[0]["ids"]) == 1 and not events[0]["truncated"]
+
+
+def test_change_notifications_from_other_workers(client):
+    if client.app.state.config.storage.backend != "postgres":
+        pytest.skip("change notifications between workers need the postgres backend")
+    import asyncpg
+    import orjson
+
+    db_worker = client.app.state.db_worker
+    settings = client.app.state.config
+    events = []
+
+    async def execute(query: str, *args):
+        conn = await asyncpg.connect(user=settings.db.user, password=settings.db.password,
+                                     host=settings.db.host, port=settings.db.port, database=settings.db.db_name)
+        try:
+            await conn.execute(query, *args)
+        finally:
+            await conn.close()
+
+    version, _ = db_worker.month_validator(2031, 5)
+    reconnect_delay = settings.notifications.reconnect_delay
+    settings.notifications.reconnect_delay = 0.05
+    db_worker.subscribe(events.append)
+    try:
+        payload = {"worker": "other", "ids": [1], "truncated": False, "months": ["2031-05"]}
+        asyncio.run(execute("SELECT pg_notify($1, $2)", settings.notifications.channel, orjson.dumps(payload).decode()))
+        assert wait_for(lambda: events)
+        asyncio.run(execute("SELECT pg_terminate_backend($1)", db_worker.listener.connection.get_server_pid()))
+        assert wait_for(lambda: any(event.get("resync") for event in events))
+    finally:
+        settings.notifications.reconnect_delay = reconnect_delay
+        db_worker.unsubscribe(events.append)
+    assert events[0] == {"worker": "other", "ids": [1], "truncated": False, "months": ["2031-05"]}
+    assert db_worker.month_validator(2031, 5)[0] != version
+    assert not db_worker.listener.connection.is_closed()
+
+
+def test_write_keeps_client_on_primary(client):
+    config = client.app.state.config
+    if config.storage.backend != "postgres":
+        pytest.skip("read replicas apply to the postgres backend only")
+    from task_planner.configs.config import Replica
+
+    config.db.replicas = [Replica(host=config.db.host)]
+    try:
+        response = client.get("/api/tasks_count", auth=("test", "test"))
+        assert "tp_primary_until" not in response.headers.get("set-cookie", "")
+        response = client.post("/add_task", data={
+            "name": "Primary Task", "year": "2031", "month": "6", "day": "2", "comment": ""
+        })
+        assert "Задача добавлена" in response.text
+        assert "tp_primary_until=" in response.headers["set-cookie"]
+        assert float(client.cookies["tp_primary_until"]) > time.time()
+    finally:
+        config.db.replicas = []
+        client.cookies.clear()
+
+
+def test_reminders_disabled_by_default(client):
+    response = client.get("/api/reminders", auth=("test", "test"))
+    assert response.status_code == 200
+    assert response.json() == {"enabled": False, "pending": 0, "reminders": []}
@@ -0,0 +1,106 @@
+import asyncio
+import gzip
+import os
+import sys
+import zlib
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from task_planner.application.compression import CompressionMiddleware, choose_encoding
+from task_planner.application.metrics import HTTP_COMPRESSION_BYTES
+from task_planner.configs.config import Config
+
+ROWS = [f"{number},Task {number},2025-03-01 10:00:00,comment,False\n" for number in range(2000)]
+
+app = FastAPI()
+app.state.config = Config.model_validate({"api": {"login": "test", "password": "test"},
+                                          "storage": {"backend": "memory"},
+                                          "compression": {"encodings": ["gzip"]}})
+app.add_middleware(CompressionMiddleware)
+
+
+@app.get("/json")
+async def large_json():
+    return ORJSONResponse({"tasks": ROWS}, headers={"ETag": '"v1"'})
+
+
+@app.get("/small")
+async def small_text():
+    return PlainTextResponse("ok")
+
+
+@app.get("/csv")
+async def streamed_csv():
+    async def chunks():
+        for start in range(0, len(ROWS), 100):
+            yield "".join(ROWS[start:start + 100])
+    return StreamingResponse(chunks(), media_type="text/csv")
+
+
+@app.get("/gzipped")
+async def gzipped():
+    return Response(gzip.compress("".join(ROWS).encode()), media_type="application/gzip")
+
+
+@app.get("/events")
+async def events():
+    return StreamingResponse(iter(["data: x\n\n" * 200]), media_type="text/event-stream")
+
+
+client = TestClient(app)
+
+
+def test_choose_encoding_follows_config_order_and_quality():
+    assert choose_encoding("gzip, deflate", ["zstd", "br", "gzip"]) == "gzip"
+    assert choose_encoding("gzip;q=0, *;q=0.5", ["gzip"]) is None
+    assert choose_encoding("*", ["gzip"]) == "gzip"
+    assert choose_encoding("identity", ["gzip"]) is None
+    assert choose_encoding("", ["gzip"]) is None
+
+
+def test_large_response_is_compressed():
+    compressed_before = HTTP_COMPRESSION_BYTES._values.get(("gzip", "out"), 0)
+    response = client.get("/json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"v1"'
+    assert int(response.headers["content-length"]) < len(response.content) / 5
+    assert response.json()["tasks"] == ROWS
+    assert HTTP_COMPRESSION_BYTES._values[("gzip", "out")] - compressed_before == int(response.headers["content-length"])
+
+
+def test_small_and_unaccepted_responses_are_not_compressed():
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/json", headers={"Accept-Encoding": "identity"}).headers
+
+
+def test_streamed_response_is_compressed_chunk_by_chunk():
+    messages = []
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/csv", "raw_path": b"/csv", "root_path": "",
+             "query_string": b"", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(app(scope, receive, send))
+    headers = dict(messages[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip" and b"content-length" not in headers
+    chunks = [message["body"] for message in messages[1:] if message["body"]]
+    assert len(chunks) > 1
+    # Every chunk is flushed, so the first one decodes without the rest.
+    assert zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(chunks[0]).startswith(ROWS[0].encode())
+    assert gzip.decompress(b"".join(chunks)).decode() == "".join(ROWS)
+
+
+def test_encoded_and_other_content_types_pass_through():
+    response = client.get("/gzipped", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert gzip.decompress(response.content).decode() == "".join(ROWS)
+    assert "content-encoding" not in client.get("/events", headers={"Accept-Encoding": "gzip"}).headers
@@ -0,0 +1,129 @@
+import asyncio
+import datetime
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from task_planner.configs.config import Config
+from task_planner.application.exceptions import TaskNotFoundError, TaskAlreadyExistsError
+from task_planner.workers.memory_worker import MemoryWorker
+
+
+@pytest.fixture
+def worker():
+    config = Config.model_validate({"api": {"login": "test", "password": "test"}, "storage": {"backend": "memory"}})
+    return MemoryWorker(config)
+
+
+def day(number: int) -> datetime.datetime:
+    return datetime.datetime(2025, 3, number)
+
+
+def test_pages_are_ordered_by_deadline_and_id(worker):
+    for number in (5, 1, 3, 1, 2):
+        asyncio.run(worker.add_task(f"Task {number} {len(worker.tasks)}", day(number), ""))
+    tasks, cursor = asyncio.run(worker.paginate_tasks(limit=3))
+    assert [task.deadline.day for task in tasks] == [1, 1, 2]
+    assert tasks[0].id < tasks[1].id
+    tasks, cursor = asyncio.run(worker.paginate_tasks(limit=3, cursor=cursor))
+    assert [task.deadline.day for task in tasks] == [3, 5]
+    assert cursor is None
+
+
+def test_filters_use_name_and_deadline_indexes(worker):
+    asyncio.run(worker.add_task("Call", day(1), "home"))
+    asyncio.run(worker.add_task("Call", day(2), "work"))
+    asyncio.run(worker.add_task("Write", day(2), "work"))
+    assert len(asyncio.run(worker.get_tasks(name="call"))) == 2
+    assert len(asyncio.run(worker.get_tasks(from_date=day(2), to_date=day(2)))) == 2
+    assert [task.name for task in asyncio.run(worker.get_tasks(comment="work", name="Write"))] == ["Write"]
+    with pytest.raises(TaskNotFoundError):
+        asyncio.run(worker.get_tasks(name="Read"))
+
+
+def test_add_and_update_keep_name_deadline_unique(worker):
+    task_id = asyncio.run(worker.add_task("Call", day(1), ""))
+    asyncio.run(worker.add_task("Call", day(2), ""))
+    with pytest.raises(TaskAlreadyExistsError) as e:
+        asyncio.run(worker.add_task("Call", day(1), ""))
+    assert e.value.task_id == task_id
+    with pytest.raises(TaskAlreadyExistsError):
+        asyncio.run(worker.update_task("Call", day(1), new_deadline=day(2)))
+    task = asyncio.run(worker.update_task("Call", day(1), new_deadline=day(3), done="True"))
+    assert task.done and asyncio.run(worker.get_tasks(from_date=day(3)))[0].id == task_id
+
+
+def test_conflicting_batch_changes_nothing(worker):
+    first = asyncio.run(worker.add_task("Call", day(1), ""))
+    second = asyncio.run(worker.add_task("Call", day(2), ""))
+    with pytest.raises(TaskAlreadyExistsError):
+        asyncio.run(worker.batch_tasks(updates=[{"ids": [first], "deadline": day(2), "done": True}]))
+    assert not asyncio.run(worker.get_tasks(task_id=first))[0].done
+    results = asyncio.run(worker.batch_tasks(updates=[{"ids": [first], "deadline": day(2)}], delete_ids=[second, 99]))
+    assert results == [(first, "update", "updated"), (second, "delete", "deleted"), (99, "delete", "not_found")]
+    assert [task.id for task in asyncio.run(worker.get_tasks(from_date=day(2)))] == [first]
+
+
+def test_calendar_counts_and_done_purge(worker):
+    asyncio.run(worker.import_tasks([(1, "Call", day(1), "", True), (2, "Write", day(1), "", False),
+                                     (3, "Call", day(1), "", False), (4, "Read", day(31), "", True)]))
+    days = asyncio.run(worker.generate_calendar(2025, 3))
+    assert days["2025-03-01"] == {"total": 2, "done": 1, "open": 1}
+    assert days["2025-03-31"] == {"total": 1, "done": 1, "open": 0}
+    assert asyncio.run(worker.delete_done_tasks(older_than=day(31), batch_size=1)) == 1
+    assert asyncio.run(worker.generate_calendar(2025, 3))["2025-03-01"] == {"total": 1, "done": 0, "open": 1}
+
+
+def test_batch_publishes_one_change_event(worker):
+    first = asyncio.run(worker.add_task("Call", day(1), ""))
+    second = asyncio.run(worker.add_task("Call", day(2), ""))
+    events = []
+    worker.subscribe(events.append)
+    asyncio.run(worker.batch_tasks(updates=[{"ids": [first], "deadline": datetime.datetime(2025, 4, 1)}],
+                                   delete_ids=[second]))
+    assert events == [{"worker": worker.worker_id, "ids": [first, second], "truncated": False,
+                       "months": ["2025-03", "2025-04"]}]
+    worker.apply_change({"worker": worker.worker_id, "months": ["2025-05"]})
+    assert len(events) == 1
+
+
+def test_archived_tasks_are_read_only_on_request(worker):
+    asyncio.run(worker.import_tasks([(1, "Call", day(1), "", True), (2, "Write", day(2), "", False),
+                                     (3, "Call", day(3), "", True), (4, "Read", day(31), "", True)]))
+    assert asyncio.run(worker.archive_done_tasks(older_than=day(31), batch_size=1)) == 2
+    assert [task.id for task in asyncio.run(worker.get_tasks(for_calendar=True))] == [2, 4]
+    tasks = asyncio.run(worker.get_tasks(limit=3, include_archived=True))
+    assert [task.id for task in tasks] == [1, 2, 3]
+    assert [task.id for task in asyncio.run(worker.get_tasks(name="call", include_archived=True))] == [1, 3]
+    with pytest.raises(TaskNotFoundError):
+        asyncio.run(worker.get_tasks(task_id=1))
+
+
+def test_calendar_loaded_before_resync_is_not_cached(worker):
+    asyncio.run(worker.add_task("Call", day(1), ""))
+    version = worker.calendar_cache.version((2025, 3))
+    worker.resync()
+    worker.calendar_cache.set((2025, 3), {"stale": True}, version)
+    assert worker.calendar_cache.get((2025, 3)) is None
+    assert asyncio.run(worker.generate_calendar(2025, 3))["2025-03-01"]["total"] == 1
+
+
+def test_purge_runs_only_in_the_lock_holder(worker):
+    asyncio.run(worker.import_tasks([(1, "Call", day(1), "", True)]))
+    lock = {"held": False}
+
+    async def acquire_lock(lock_id, on_lost=None):
+        return lock["held"]
+
+    async def holds_lock(lock_id):
+        return lock["held"]
+
+    worker.acquire_lock, worker.holds_lock = acquire_lock, holds_lock
+    asyncio.run(worker.purge_done_tasks())
+    assert len(worker.tasks) == 1
+    lock["held"] = True
+    asyncio.run(worker.purge_done_tasks())
+    assert len(worker.tasks) == 0
@@ -0,0 +1,85 @@
+import asyncio
+import datetime
+import os
+import sys
+
+import asyncpg
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from task_planner.application.exceptions import MigrationError
+from task_planner.configs.config import load_config
+from task_planner.workers.migrations import MIGRATIONS, LATEST_VERSION, connect, migrate
+
+
+@pytest.fixture
+def config():
+    config = load_config()
+    if config.storage.backend != "postgres":
+        pytest.skip("schema migrations apply to the postgres backend only")
+    # A database of its own, left at the schema of the first version.
+    config.db.db_name = "test_migrations"
+
+    async def recreate():
+        conn = await asyncpg.connect(user=config.db.user, password=config.db.password,
+                                     host=config.db.host, port=config.db.port)
+        try:
+            await conn.execute(f"DROP DATABASE IF EXISTS {config.db.db_name} WITH (FORCE)")
+            await conn.execute(f"CREATE DATABASE {config.db.db_name}")
+        finally:
+            await conn.close()
+        conn = await connect(config)
+        try:
+            for statement in MIGRATIONS[0].statements:
+                await conn.execute(statement)
+        finally:
+            await conn.close()
+    asyncio.run(recreate())
+    return config
+
+
+DEADLINE = datetime.datetime(2025, 3, 1, 10)
+
+
+async def insert_duplicates(conn):
+    await conn.executemany("INSERT INTO tasks_data (name, deadline, comment, done) VALUES ($1, $2, $3, false)",
+                           [("Call", DEADLINE, "first"), ("Call", DEADLINE, "second"),
+                            ("Call", DEADLINE, "third"), ("Write", DEADLINE, "only")])
+
+
+def test_duplicate_tasks_block_the_unique_index(config):
+    async def scenario():
+        conn = await connect(config)
+        try:
+            await insert_duplicates(conn)
+            with pytest.raises(MigrationError) as error:
+                await migrate(config, create_db=False)
+            version = await conn.fetchval("SELECT max(version) FROM schema_version")
+            count = await conn.fetchval("SELECT count(*) FROM tasks_data")
+        finally:
+            await conn.close()
+        return error.value.reason, version, count
+
+    reason, version, count = asyncio.run(scenario())
+    assert "Call, 2025-03-01 10:00:00, 3" in reason and "Write" not in reason
+    assert version == 1
+    assert count == 4
+
+
+def test_duplicate_tasks_are_moved_aside_on_request(config):
+    async def scenario():
+        conn = await connect(config)
+        try:
+            await insert_duplicates(conn)
+            version = await migrate(config, create_db=False, resolve_conflicts=True)
+            rows = await conn.fetch("SELECT name, comment FROM tasks_data ORDER BY id")
+            moved = await conn.fetch("SELECT name, comment FROM tasks_data_duplicates ORDER BY id")
+        finally:
+            await conn.close()
+        return version, [tuple(row) for row in rows], [tuple(row) for row in moved]
+
+    version, rows, moved = asyncio.run(scenario())
+    assert version == LATEST_VERSION
+    assert rows == [("Call", "first"), ("Write", "only")]
+    assert moved == [("Call", "second"), ("Call", "third")]
@@ -0,0 +1,110 @@
+import asyncio
+import datetime
+import os
+import sys
+
+import asyncpg
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from task_planner.configs.config import load_config
+from task_planner.workers.db_worker import DBWorker
+from task_planner.workers.migrations import (migrate, partition_tasks, create_month_partitions, month_start,
+                                             partition_name)
+
+
+@pytest.fixture
+def config():
+    config = load_config()
+    if config.storage.backend != "postgres":
+        pytest.skip("partitioning applies to the postgres backend only")
+    # A database of its own, the conversion must not disturb the other tests.
+    config.db.db_name = "test_partitions"
+    config.notifications.enabled = False
+
+    async def recreate():
+        conn = await asyncpg.connect(user=config.db.user, password=config.db.password,
+                                     host=config.db.host, port=config.db.port)
+        try:
+            await conn.execute(f"DROP DATABASE IF EXISTS {config.db.db_name} WITH (FORCE)")
+        finally:
+            await conn.close()
+        await migrate(config)
+    asyncio.run(recreate())
+    return config
+
+
+def run(config, scenario):
+    async def main():
+        worker = DBWorker(config)
+        await worker.init()
+        try:
+            return await scenario(worker)
+        finally:
+            await worker.close()
+    return asyncio.run(main())
+
+
+def now() -> datetime.datetime:
+    return datetime.datetime.now().replace(microsecond=0)
+
+
+def test_partition_tasks_keeps_tasks_and_ids(config):
+    async def add(worker):
+        return [await worker.add_task(f"Task {days}", now() + datetime.timedelta(days=days), "")
+                for days in (-900, -30, 0, 45, 800)]
+
+    ids = run(config, add)
+    assert asyncio.run(partition_tasks(config))
+    assert not asyncio.run(partition_tasks(config))
+
+    async def scenario(worker):
+        tasks = await worker.get_tasks(for_calendar=True)
+        new_id = await worker.add_task("New", now(), "")
+        return worker.partitioned, sorted(task.id for task in tasks), new_id
+
+    partitioned, task_ids, new_id = run(config, scenario)
+    assert partitioned
+    assert task_ids == ids
+    assert new_id == max(ids) + 1
+
+
+def test_new_partition_takes_its_rows_from_default(config):
+    asyncio.run(partition_tasks(config))
+    deadline = datetime.datetime(now().year + 5, 6, 15)
+
+    async def scenario(worker):
+        task_id = await worker.add_task("Far away", deadline, "")
+        async with worker.engine.begin() as conn:
+            created = await create_month_partitions(conn, deadline.date(), deadline.date())
+            table = (await conn.exec_driver_sql(
+                f"SELECT tableoid::regclass::text FROM tasks_data WHERE id = {task_id}"
+            )).scalar()
+        return created, table, await worker.get_tasks(task_id=task_id)
+
+    created, table, tasks = run(config, scenario)
+    assert created == 1
+    assert table == partition_name(month_start(deadline.date()))
+    assert tasks[0].name == "Far away"
+
+
+def test_archive_moves_done_tasks_out_of_reads(config):
+    asyncio.run(partition_tasks(config))
+    start = now() - datetime.timedelta(days=400)
+
+    async def scenario(worker):
+        for day in range(5):
+            await worker.add_task(f"Old {day}", start + datetime.timedelta(days=day), "")
+            if day % 2 == 0:
+                await worker.update_task(f"Old {day}", start + datetime.timedelta(days=day), done="True")
+        archived = await worker.archive_done_tasks(now() - datetime.timedelta(days=90), batch_size=2)
+        live = await worker.get_tasks(for_calendar=True)
+        page = await worker.get_tasks(limit=4, include_archived=True)
+        rest = await worker.get_tasks(limit=4, include_archived=True, after=(page[-1].deadline, page[-1].id))
+        return archived, live, page + rest
+
+    archived, live, tasks = run(config, scenario)
+    assert archived == 3
+    assert [task.name for task in live] == ["Old 1", "Old 3"]
+    assert [task.name for task in tasks] == [f"Old {day}" for day in range(5)]
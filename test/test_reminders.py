@@ -0,0 +1,146 @@
+import asyncio
+import datetime
+import os
+import sys
+
+import httpx
+import orjson
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from task_planner.configs.config import Config
+from task_planner.workers.memory_worker import MemoryWorker
+from task_planner.workers.reminders import ReminderScheduler
+
+
+def make_config(**reminders) -> Config:
+    return Config.model_validate({"api": {"login": "test", "password": "test"}, "storage": {"backend": "memory"},
+                                  "reminders": {"enabled": True, **reminders}})
+
+
+def soon(seconds: float) -> datetime.datetime:
+    return datetime.datetime.now() + datetime.timedelta(seconds=seconds)
+
+
+async def wait_for(condition, attempts: int = 100):
+    for _ in range(attempts):
+        if condition():
+            return True
+        await asyncio.sleep(0.02)
+    return False
+
+
+def run(config: Config, scenario):
+    async def main():
+        worker = MemoryWorker(config)
+        scheduler = ReminderScheduler(config, worker)
+        try:
+            return await scenario(worker, scheduler)
+        finally:
+            await scheduler.close()
+    return asyncio.run(main())
+
+
+def test_loaded_reminders_fire_in_deadline_order(tmp_path):
+    path = tmp_path / "reminders.ndjson"
+    config = make_config(sinks=["file"], file_path=str(path))
+
+    async def scenario(worker, scheduler):
+        await worker.add_task("Later", soon(0.2), "")
+        await worker.add_task("First", soon(0.1), "note")
+        await worker.add_task("Next hour", soon(3600), "")
+        await worker.add_task("Overdue", soon(-60), "")
+        await scheduler.start()
+        await scheduler.ready.wait()
+        pending = len(scheduler.pending)
+        assert await wait_for(lambda: path.exists() and len(path.read_bytes().splitlines()) == 2)
+        return pending, [orjson.loads(line) for line in path.read_bytes().splitlines()], scheduler.upcoming(5)
+
+    pending, sent, upcoming = run(config, scenario)
+    assert pending == 3
+    assert [(reminder["name"], reminder["comment"]) for reminder in sent] == [("First", "note"), ("Later", "")]
+    assert [reminder.name for reminder in upcoming] == ["Next hour"]
+
+
+def test_heap_follows_task_changes(tmp_path):
+    path = tmp_path / "reminders.ndjson"
+    config = make_config(sinks=["file"], file_path=str(path), lead_minutes=60)
+
+    async def scenario(worker, scheduler):
+        hour = 3600
+        moved = await worker.add_task("Moved", soon(2 * hour), "")
+        done = await worker.add_task("Done", soon(hour + 0.1), "")
+        await worker.add_task("Deleted", soon(hour + 0.1), "")
+        await scheduler.start()
+        await scheduler.ready.wait()
+        await worker.add_task("Added", soon(hour + 0.2), "")
+        task = (await worker.get_tasks(task_id=moved))[0]
+        for seconds in (3 * hour, 4 * hour, hour + 0.3):
+            task = await worker.update_task("Moved", task.deadline, new_deadline=soon(seconds))
+        await worker.update_task("Done", (await worker.get_tasks(task_id=done))[0].deadline, done="True")
+        deleted = await worker.get_tasks(name="Deleted")
+        await worker.delete_task("Deleted", deleted[0].deadline)
+        assert await wait_for(lambda: path.exists() and len(path.read_bytes().splitlines()) == 2)
+        await asyncio.sleep(0.2)
+        return [orjson.loads(line)["name"] for line in path.read_bytes().splitlines()], scheduler
+
+    sent, scheduler = run(config, scenario)
+    assert sent == ["Added", "Moved"]
+    assert not scheduler.pending
+    # The first item of "Moved" is deleted lazily, when it reaches the top of the heap.
+    assert [task_id for _, task_id, _ in scheduler.heap] == [1]
+
+
+def test_webhook_sink_posts_reminders():
+    config = make_config(sinks=["log", "webhook"], webhook_url="http://hooks.test/reminders")
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(orjson.loads(request.content))
+        return httpx.Response(500 if len(requests) == 1 else 204)
+
+    async def scenario(worker, scheduler):
+        scheduler.sinks[1].client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        await scheduler.start()
+        await scheduler.ready.wait()
+        await worker.add_task("Failing", soon(0.05), "")
+        await worker.add_task("Call", soon(0.1), "")
+        assert await wait_for(lambda: len(requests) == 2)
+
+    run(config, scenario)
+    assert [request["name"] for request in requests] == ["Failing", "Call"]
+
+
+def test_sinks_require_their_settings():
+    with pytest.raises(ValueError):
+        make_config(sinks=["webhook"])
+
+
+def test_reminders_stop_when_the_lock_is_lost(tmp_path):
+    path = tmp_path / "reminders.ndjson"
+    config = make_config(sinks=["file"], file_path=str(path), leader_retry_seconds=0.05)
+    lock = {"held": True, "acquired": 0}
+
+    async def scenario(worker, scheduler):
+        async def acquire_lock(lock_id, on_lost=None):
+            lock["acquired"] += 1
+            return lock["held"]
+
+        async def holds_lock(lock_id):
+            return lock["held"]
+
+        worker.acquire_lock, worker.holds_lock = acquire_lock, holds_lock
+        await worker.add_task("Lost", soon(0.5), "")
+        await scheduler.start()
+        await scheduler.ready.wait()
+        lock["held"] = False
+        assert await wait_for(lambda: not scheduler.ready.is_set())
+        pending = len(scheduler.pending)
+        await asyncio.sleep(0.6)
+        return pending, lock["acquired"]
+
+    pending, acquired = run(config, scenario)
+    assert pending == 0
+    assert acquired > 1
+    assert not path.exists()
@@ -0,0 +1,113 @@
+import asyncio
+import datetime
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from task_planner.configs.config import load_config, Replica
+from task_planner.application.consistency import ReadConsistency, read_consistency
+from task_planner.application.metrics import DB_READS
+from task_planner.application.middlewares import ReadYourWritesMiddleware
+from task_planner.workers.db_worker import DBWorker
+from task_planner.workers.migrations import migrate
+
+
+@pytest.fixture
+def config():
+    config = load_config()
+    if config.storage.backend != "postgres":
+        pytest.skip("read replicas apply to the postgres backend only")
+    asyncio.run(migrate(config))
+    # The primary itself stands in for a healthy replica, nothing listens on port 1.
+    config.db.replicas = [Replica(host=config.db.host), Replica(host=config.db.host, port=1)]
+    config.notifications.enabled = False
+    return config
+
+
+def run(config, scenario):
+    async def main():
+        worker = DBWorker(config)
+        await worker.init()
+        try:
+            return await scenario(worker)
+        finally:
+            await worker.close()
+    return asyncio.run(main())
+
+
+def test_reads_go_to_healthy_replicas(config):
+    async def scenario(worker):
+        await worker.count_tasks()
+        return [replica.healthy for replica in worker.reads.replicas], {worker.reads.choose().name for _ in range(20)}
+
+    healthy, targets = run(config, scenario)
+    assert healthy == [True, False]
+    assert targets == {f"{config.db.host}:{config.db.port}"}
+
+
+def test_unreachable_replica_fails_over_to_primary(config):
+    async def scenario(worker):
+        live, dead = worker.reads.replicas
+        live.healthy, dead.healthy = False, True
+        # A table validator that has just changed would send the count to the primary directly.
+        worker.modified_at -= datetime.timedelta(seconds=config.db.read_your_writes_seconds + 2)
+        counts = await worker.count_tasks()
+        return counts, dead.healthy, worker.reads.choose().name
+
+    counts, dead_healthy, target = run(config, scenario)
+    assert "total" in counts
+    assert not dead_healthy and target == "primary"
+
+
+def test_validated_reads_use_primary_after_a_change(config):
+    async def scenario(worker):
+        worker.modified_at -= datetime.timedelta(seconds=config.db.read_your_writes_seconds + 2)
+        stale = worker._table_changed_recently()
+        worker.apply_change({"worker": "other", "ids": [1], "months": ["2032-07"]})
+        primary_reads = DB_READS._values.get(("primary",), 0)
+        await worker.count_tasks()
+        await worker.get_task_rows(limit=1)
+        return stale, worker._table_changed_recently(), DB_READS._values.get(("primary",), 0) - primary_reads
+
+    stale, changed, primary_reads = run(config, scenario)
+    assert not stale and changed
+    assert primary_reads == 2
+
+
+def test_client_reads_its_own_writes_from_primary(config):
+    deadline = datetime.datetime(2032, 7, 1)
+
+    async def scenario(worker):
+        consistency = ReadConsistency()
+        read_consistency.set(consistency)
+        before = worker.reads.choose().name
+        task_id = await worker.add_task(f"Replica task {datetime.datetime.now().timestamp()}", deadline, "")
+        after = worker.reads.choose().name
+        changed = worker._changed_recently(deadline, deadline + datetime.timedelta(days=31))
+        await worker.batch_tasks(delete_ids=[task_id])
+        return before, after, consistency.wrote, changed
+
+    before, after, wrote, changed = run(config, scenario)
+    assert before != "primary" and after == "primary"
+    assert wrote and changed
+
+
+def test_primary_cookie_is_bounded_by_the_window(config):
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(read_consistency.get().primary_until)
+
+    middleware = ReadYourWritesMiddleware(app)
+    state = SimpleNamespace(config=config)
+    for cookie in ("inf", "nan", "9999999999", "wrong"):
+        scope = {"type": "http", "app": SimpleNamespace(state=state),
+                 "headers": [(b"cookie", f"tp_primary_until={cookie}".encode())]}
+        asyncio.run(middleware(scope, None, None))
+    assert seen[0] == seen[1] == seen[3] == 0
+    assert seen[2] <= time.time() + config.db.read_your_writes_seconds